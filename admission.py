@@ -0,0 +1,136 @@
+import time
+import logging
+
+from tracing import TracingUpdateProcessor
+
+log = logging.getLogger(__name__)
+
+# Ingress admission control: updates that start Gemini work (essays, topics,
+# photos, recommendation/refine buttons) need a token from the chat's bucket
+# and a free in-flight slot, per chat and overall. Excess is turned away at
+# once with a short message instead of queueing behind the model. Commands,
+# band numbers and menu buttons always get through, so /start and Home keep
+# working for a throttled chat.
+ADMISSION_RATE = 1 / 20             # heavy jobs per second per chat, long-run
+ADMISSION_BURST = 3                 # heavy jobs a chat can start back to back
+ADMISSION_MAX_INFLIGHT_PER_CHAT = 1
+ADMISSION_MAX_INFLIGHT = 64         # heavy jobs across all chats
+ADMISSION_NOTICE_INTERVAL = 10      # seconds between rejection messages to one chat
+ADMISSION_IDLE_CHAT_SECONDS = 600   # idle per-chat state is dropped after this
+HEAVY_CALLBACKS = frozenset({"grammar_rec", "refine"})
+
+BUSY_CHAT_MESSAGE = "⏳ Still working on your last request. Please wait for it to finish."
+RATE_LIMITED_MESSAGE = "🐢 You're sending requests too fast. Please try again in {seconds}s."
+OVERLOADED_MESSAGE = "🚦 The assistant is very busy right now. Please try again in a minute."
+
+
+def is_heavy(update):
+    query = update.callback_query
+    if query is not None:
+        return query.data in HEAVY_CALLBACKS
+    message = update.message
+    if message is None:
+        return False
+    if message.photo:
+        return True
+    text = (message.text or "").strip()
+    # Commands and band numbers are cheap; any other text is a topic or an essay
+    return bool(text) and not text.startswith("/") and not text.isdigit()
+
+
+class _ChatState:
+    def __init__(self, now):
+        self.tokens = float(ADMISSION_BURST)
+        self.updated = now
+        self.inflight = 0
+        self.notified = 0.0
+
+    def refill(self, now):
+        self.tokens = min(ADMISSION_BURST, self.tokens + (now - self.updated) * ADMISSION_RATE)
+        self.updated = now
+
+
+class AdmissionController:
+    def __init__(self):
+        self._chats = {}
+        self.inflight = 0
+        self.stats = {'admitted': 0, 'rejected_busy': 0, 'rejected_rate': 0, 'rejected_overload': 0}
+
+    def _chat(self, chat_id, now):
+        if len(self._chats) > 1000:
+            for stale in [c for c, s in self._chats.items()
+                          if not s.inflight and now - s.updated > ADMISSION_IDLE_CHAT_SECONDS]:
+                del self._chats[stale]
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = _ChatState(now)
+        return state
+
+    def admit(self, chat_id):
+        # None when admitted (call release() afterwards), else the message for the user
+        now = time.monotonic()
+        state = self._chat(chat_id, now)
+        state.refill(now)
+        if state.inflight >= ADMISSION_MAX_INFLIGHT_PER_CHAT:
+            self.stats['rejected_busy'] += 1
+            return BUSY_CHAT_MESSAGE
+        if state.tokens < 1:
+            self.stats['rejected_rate'] += 1
+            return RATE_LIMITED_MESSAGE.format(seconds=int((1 - state.tokens) / ADMISSION_RATE) + 1)
+        if self.inflight >= ADMISSION_MAX_INFLIGHT:
+            self.stats['rejected_overload'] += 1
+            return OVERLOADED_MESSAGE
+        state.tokens -= 1
+        state.inflight += 1
+        self.inflight += 1
+        self.stats['admitted'] += 1
+        return None
+
+    def release(self, chat_id):
+        state = self._chats.get(chat_id)
+        if state is not None:
+            state.inflight -= 1
+            state.updated = time.monotonic()
+        self.inflight -= 1
+
+    def should_notify(self, chat_id):
+        # One rejection message per interval; a spamming chat gets the rest dropped silently
+        state = self._chats[chat_id]
+        now = time.monotonic()
+        if now - state.notified < ADMISSION_NOTICE_INTERVAL:
+            return False
+        state.notified = now
+        return True
+
+    def snapshot(self):
+        return {**self.stats, 'inflight': self.inflight, 'chats': len(self._chats)}
+
+
+class AdmissionUpdateProcessor(TracingUpdateProcessor):
+    # Traced like TracingUpdateProcessor; heavy updates must be admitted first
+    def __init__(self, max_concurrent_updates, controller=None):
+        super().__init__(max_concurrent_updates)
+        self.controller = controller or AdmissionController()
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat
+        if chat is None or not is_heavy(update):
+            return await super().do_process_update(update, coroutine)
+        rejection = self.controller.admit(chat.id)
+        if rejection is not None:
+            coroutine.close()   # the handlers never run
+            log.info("Rejected update from chat %s: %s", chat.id, rejection)
+            return await super().do_process_update(update, self._reject(update, chat.id, rejection))
+        try:
+            await super().do_process_update(update, coroutine)
+        finally:
+            self.controller.release(chat.id)
+
+    async def _reject(self, update, chat_id, text):
+        try:
+            if update.callback_query is not None:
+                await update.callback_query.answer(text)
+            elif self.controller.should_notify(chat_id):
+                await update.effective_message.reply_text(text)
+        except Exception as e:
+            log.warning("Rejection notice to chat %s failed: %s", chat_id, e)
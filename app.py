@@ -1,23 +1,62 @@
+import time
+IMPORT_STARTED = time.monotonic()   # startup timings are measured from here
+
 import re
 import asyncio
-import matplotlib.pyplot as plt
+import logging
 import numpy as np
 from io import BytesIO
-from PIL import Image
-import requests
-from google import genai
+from llm import LLMGateway, BackendUnavailable, http_options, HTTP2_AVAILABLE, ROUTER_MIN_SAMPLES
+from essay_pool import EssayPool, essay_fingerprint
+from topic_index import TopicIndex
+from near_dup import NearDuplicateIndex
+from send_scheduler import SendScheduler
+import rubric
+import spellcheck
+import lexicon
+import metrics
+import log_pipeline
+import tracing
+from admission import AdmissionUpdateProcessor, ADMISSION_MAX_INFLIGHT
+from brownout import BrownoutController, FEATURE_LEVELS
+from essay_metrics import (
+    split_paragraphs,
+    paragraph_hash,
+    paragraph_metrics,
+    build_record,
+    diff_paragraphs,
+    revise_analysis,
+    local_analysis,
+    band_distance
+)
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
+    TypeHandler,
     ConversationHandler,
     filters
 )
 
-# Initialize Gemini client
-client = genai.Client(api_key="add your api key in here")
+log = logging.getLogger(__name__)
+
+GEMINI_BASE_URL = None          # another Gemini endpoint, e.g. a benchmark's stub server
+
+# matplotlib, Pillow and the Gemini SDK are imported on first use or by the
+# startup warm-up (in a thread, next to the network warm-up steps)
+def make_client():
+    from google import genai
+    import gemini_fixtures
+    client = genai.Client(api_key="add your api key in here", http_options=http_options(GEMINI_BASE_URL))
+    # With gemini_fixtures.GEMINI_FIXTURE_MODE set, calls are recorded or replayed
+    return gemini_fixtures.wrap(client)
+
+def import_heavy_modules():
+    import matplotlib.pyplot
+    import PIL.Image
+    import google.genai.types
 
 # Conversation states
 SELECT_OPTION, ASK_BAND, ASK_TOPIC, PROCESS_ESSAY, HANDWRITING_UPLOAD = range(5)
@@ -76,20 +115,191 @@ BAND_INSTRUCTIONS = {
 }
 
 # Retry decorator for API calls
-import time
+import weakref
+from collections import deque
 
-def with_retries(func, max_attempts=3, delay=2):
+async def with_retries(func, max_attempts=3, delay=2):
     for attempt in range(max_attempts):
         try:
-            return func()
+            with tracing.span("llm_attempt", attempt=attempt + 1):
+                return await func()
+        except BackendUnavailable:
+            raise
         except Exception as e:
             if attempt < max_attempts - 1:
-                print(f"Attempt {attempt + 1} failed: {e}. Retrying in {delay} seconds...")
-                time.sleep(delay)
+                log.warning("Attempt %d failed: %s. Retrying in %s seconds...", attempt + 1, e, delay)
+                await asyncio.sleep(delay)
             else:
                 raise e
 
+# Routes each call to a model by task type and caps concurrent Gemini requests;
+# the client is built on the first call
+gateway = LLMGateway(client_factory=make_client)
+
+# Shown instead of an error while the circuit breaker is open
+BACKEND_DOWN_MESSAGE = "😴 Our writing assistant is taking a short break. Please try again in a minute."
+# Topic match for cached essays while the backend is down. Lowest threshold with no
+# false hits on benchmarks/topic_pairs.py (the closest near miss scores 0.75); unlike
+# the normal lookup, essays the chat has seen already are served too
+BREAKER_TOPIC_THRESHOLD = 0.78
+RELATED_ESSAY_NOTICE = ("ℹ️ Our writing assistant is taking a short break, so this is a saved essay "
+                        "on a closely matching topic. It may not follow your exact wording.")
+
+# Inputs below these sizes go to the 'light' route
+LIGHT_OCR_MAX_BYTES = 300_000
+LIGHT_ANALYSIS_MAX_WORDS = 120
+
+# In-flight LLM work per chat, so Home / /start can cancel it
+CANCELLED = object()
+inflight_tasks = {}
+_abandoned_tasks = weakref.WeakSet()
+
+async def run_cancellable(update: Update, coro):
+    chat_id = update.effective_chat.id
+    task = asyncio.ensure_future(coro)
+    inflight_tasks.setdefault(chat_id, set()).add(task)
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if task in _abandoned_tasks:
+            return CANCELLED
+        raise
+    finally:
+        tasks = inflight_tasks.get(chat_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del inflight_tasks[chat_id]
+
+def cancel_inflight(chat_id):
+    tasks = inflight_tasks.pop(chat_id, set())
+    for task in tasks:
+        _abandoned_tasks.add(task)
+        task.cancel()
+    if tasks:
+        log.info("Cancelled %d in-flight task(s) for chat %s", len(tasks), chat_id)
+    return len(tasks)
+
+def start_background(update: Update, coro):
+    # Like run_cancellable, but the caller doesn't wait for the result
+    chat_id = update.effective_chat.id
+    task = asyncio.ensure_future(coro)
+    inflight_tasks.setdefault(chat_id, set()).add(task)
+
+    def forget(done):
+        tasks = inflight_tasks.get(chat_id)
+        if tasks is not None:
+            tasks.discard(done)
+            if not tasks:
+                del inflight_tasks[chat_id]
+    task.add_done_callback(forget)
+    return task
+
+# Speculative prefetch of grammar recommendations once analysis completes
+PREFETCH_RECOMMENDATIONS = True
+PREFETCH_MAX_CONCURRENT = 2     # of the gateway's GEMINI_MAX_CONCURRENT slots; the rest stay free for users
+PREFETCH_TOKEN_BUDGET_PER_HOUR = 500_000
+
+prefetch_stats = {
+    'started': 0,
+    'skipped_brownout': 0,
+    'hits': 0,
+    'late_hits': 0,
+    'misses': 0,
+    'cancelled': 0,
+    'failed': 0,
+    'skipped_budget': 0,
+    'wasted': 0,
+    'wasted_tokens': 0,
+    'tokens': 0
+}
+_prefetch_spend = deque()  # (timestamp, tokens)
+_prefetch_running = 0
+
+def _response_tokens(response):
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'total_token_count', None) or 0
+
+def _prefetch_tokens_last_hour():
+    cutoff = time.monotonic() - 3600
+    while _prefetch_spend and _prefetch_spend[0][0] < cutoff:
+        _prefetch_spend.popleft()
+    return sum(tokens for _, tokens in _prefetch_spend)
+
+async def _prefetch_recommendations(essay):
+    try:
+        response = await grammar_recommendations(essay, hedge=False)
+    except Exception as e:
+        log.warning("Prefetch error: %s", e)
+        prefetch_stats['failed'] += 1
+        return None
+    tokens = _response_tokens(response)
+    _prefetch_spend.append((time.monotonic(), tokens))
+    prefetch_stats['tokens'] += tokens
+    return response
+
+def _prefetch_finished(task):
+    global _prefetch_running
+    _prefetch_running -= 1
+
+def start_prefetch(update: Update, context, essay):
+    global _prefetch_running
+    discard_prefetch(context.user_data)
+    if not PREFETCH_RECOMMENDATIONS or gateway.breaker.is_open():
+        return
+    if not brownout.allows('speculative'):
+        prefetch_stats['skipped_brownout'] += 1
+        return
+    if (_prefetch_running >= PREFETCH_MAX_CONCURRENT
+            or _prefetch_tokens_last_hour() >= PREFETCH_TOKEN_BUDGET_PER_HOUR):
+        prefetch_stats['skipped_budget'] += 1
+        return
+    prefetch_stats['started'] += 1
+    # Counted before the task first runs, so callbacks in the same tick see it;
+    # the done callback also fires for a task cancelled before it started
+    _prefetch_running += 1
+    task = start_background(update, _prefetch_recommendations(essay))
+    task.add_done_callback(_prefetch_finished)
+    context.user_data['prefetch'] = {'essay': essay, 'task': task}
+
+def discard_prefetch(user_data):
+    # Drop an unused prefetch, counting what it cost
+    prefetch = user_data.pop('prefetch', None)
+    if not prefetch:
+        return
+    task = prefetch['task']
+    if not task.done():
+        task.cancel()
+        prefetch_stats['cancelled'] += 1
+    elif not task.cancelled() and task.result() is not None:
+        prefetch_stats['wasted'] += 1
+        prefetch_stats['wasted_tokens'] += _response_tokens(task.result())
+
+async def take_prefetched_recommendations(user_data, essay):
+    prefetch = user_data.get('prefetch')
+    if not prefetch or prefetch['essay'] != essay:
+        discard_prefetch(user_data)
+        prefetch_stats['misses'] += 1
+        return None
+    user_data.pop('prefetch')
+    task = prefetch['task']
+    was_done = task.done()
+    try:
+        response = await task
+    except asyncio.CancelledError:
+        if task in _abandoned_tasks:
+            return CANCELLED
+        raise
+    if response is None:
+        prefetch_stats['misses'] += 1
+        return None
+    prefetch_stats['hits' if was_done else 'late_hits'] += 1
+    return response.text.replace("**", "").strip()
+
+@metrics.track_handler
 async def start(update: Update, context):
+    discard_prefetch(context.user_data)
+    cancel_inflight(update.effective_chat.id)
     keyboard = [
         [InlineKeyboardButton("Generate Essay", callback_data='generate')],
         [InlineKeyboardButton("Analyze Essay", callback_data='analyze')],
@@ -99,6 +309,7 @@ async def start(update: Update, context):
     await update.message.reply_text("📝 IELTS Essay Assistant:", reply_markup=reply_markup)
     return SELECT_OPTION
 
+@metrics.track_handler
 async def select_option(update: Update, context):
     query = update.callback_query
     await query.answer()
@@ -113,34 +324,47 @@ async def select_option(update: Update, context):
         return HANDWRITING_UPLOAD
     return SELECT_OPTION
 
+def preprocess_handwriting(img_bytes):
+    # Grayscale PNG for OCR
+    from PIL import Image
+    img = Image.open(BytesIO(img_bytes)).convert('L')
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+@metrics.track_handler
 async def process_handwriting(update: Update, context):
     try:
         # Get the highest resolution photo
         photo = update.message.photo[-1]
-        file = await photo.get_file()
-        
-        # Download image
-        img_bytes = await file.download_as_bytearray()
+        with metrics.timed("download"):
+            file = await photo.get_file()
+            
+            # Download image
+            img_bytes = await file.download_as_bytearray()
         
         # Optional: Simple preprocessing (remove Fourier Transform for simplicity)
         try:
-            img = Image.open(BytesIO(img_bytes)).convert('L')  # Grayscale
-            buffer = BytesIO()
-            img.save(buffer, format="PNG")
-            image_data = buffer.getvalue()
+            with metrics.timed("preprocess"):
+                image_data = preprocess_handwriting(img_bytes)
         except Exception as e:
-            print(f"Image processing error: {e}")
+            log.warning("Image processing error: %s", e)
             image_data = img_bytes  # Fallback to original
 
         # Send to Gemini with retries
+        from google.genai import types
+        ocr_task = 'light' if len(image_data) <= LIGHT_OCR_MAX_BYTES else 'ocr'
         try:
-            response = with_retries(lambda: client.models.generate_content(
-                model="gemini-2.0-flash",
+            response = await run_cancellable(update, with_retries(lambda: gateway.generate(
+                task=ocr_task,
+                site='handwriting',
                 contents=[
-                    {"mime_type": "image/png", "data": image_data},
+                    types.Part.from_bytes(data=image_data, mime_type="image/png"),
                     "Extract text from this handwritten or printed image exactly as written:"
                 ]
-            ))
+            )))
+            if response is CANCELLED:
+                return SELECT_OPTION
             extracted_text = response.text.replace("**", "").strip()
             
             keyboard = [[InlineKeyboardButton("Restart", callback_data='restart')]]
@@ -148,6 +372,8 @@ async def process_handwriting(update: Update, context):
                 f"✍️ Extracted Text:\n\n{extracted_text}",
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
+        except BackendUnavailable:
+            await update.message.reply_text(BACKEND_DOWN_MESSAGE)
         except Exception as e:
             await update.message.reply_text(f"❌ Error processing handwriting: {str(e)}")
 
@@ -156,6 +382,7 @@ async def process_handwriting(update: Update, context):
     
     return SELECT_OPTION
 
+@metrics.track_handler
 async def ask_band(update: Update, context):
     try:
         band = int(update.message.text)
@@ -169,11 +396,40 @@ async def ask_band(update: Update, context):
         await update.message.reply_text("❌ Numbers only (3-9):")
         return ASK_BAND
 
+@metrics.track_handler
 async def ask_topic(update: Update, context):
     context.user_data['topic'] = update.message.text
     band = context.user_data['band']
-    essay = await generate_essay(context.user_data['topic'], band)
-    await loading(update)
+    seen = context.chat_data.setdefault('seen_essays', set())
+    essay = essay_pool.take(context.user_data['topic'], band, seen)
+    if essay is None:
+        essay = topic_cache.lookup(context.user_data['topic'], band)
+        if essay is not None:
+            if essay_fingerprint(essay) in seen:
+                # Asking again means wanting a new essay, not the cached one
+                essay = None
+            else:
+                seen.add(essay_fingerprint(essay))
+    if essay is None and gateway.breaker.is_open():
+        # Backend is down: a loosely matching cached essay beats an error
+        essay = topic_cache.lookup(context.user_data['topic'], band, threshold=BREAKER_TOPIC_THRESHOLD)
+        if essay is None:
+            await update.message.reply_text(
+                BACKEND_DOWN_MESSAGE,
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Home🏡", callback_data='restart')]])
+            )
+            return SELECT_OPTION
+        await update.message.reply_text(RELATED_ESSAY_NOTICE)
+    if essay is None:
+        essay = await run_cancellable(update, generate_essay_best_of(context.user_data['topic'], band))
+        if essay is CANCELLED:
+            return SELECT_OPTION
+        if not essay.startswith("⚠️"):
+            essay_pool.add(context.user_data['topic'], band, essay)
+            topic_cache.add(context.user_data['topic'], band, essay)
+            seen.add(essay_fingerprint(essay))
+        # Pool and cache hits are served at once; only a live generation gets the animation
+        await loading(update)
     keyboard = [[InlineKeyboardButton("Restart", callback_data='restart')]]
     await update.message.reply_text(
         f"📝 Band {band} Essay:\n\n{essay}",
@@ -191,260 +447,226 @@ STRICTLY FOLLOW THESE GUIDELINES:
 - Cohesion must be appropriate: {instructions['cohesion']}
 - Length requirement: {instructions['length']}
 - Error level: {instructions['errors']}
-- Ensure connector count is at least 12 for Band 8, 10 for Band 7, and 8 for Band 6.
-- Ensure repeated words are less than 3 for Band 8, less than 5 for Band 7, and less than 7 for Band 6.
 - DO NOT exceed the expected complexity for Band {band}.
--Generate the essay based on the FOLLOWING THESE RULES to get the exact band score you generated in the analysis result:
-1. Grammar Issues: Give ONLY Excellent/Good/Fair/Poor
--Classify the grammar quality of the essay as:
-Must be exactly error in these ranges
-for band 9:<2 grammar issues => Excellent
-for band 8:4-6 grammar issues => Good
-for band 7:8-9 grammar issues=> Fair
-for band 6:11-13 grammar issues=> Fair
-for band 5:14-16 grammar issues => Poor
-for band 4:18-20 grammar issues => Poor
-for band 3:>22 grammar issues => Poor
-
-2. Connector Count: Classify as based on the number of connectors (e.g., however, furthermore, and).
-Classify the essay based on the number of connectors (e.g., "however," "furthermore," "and") (count conjunction words):
-for band 3:<2 connectors => Low
-for band 4:3-4 connectors => Low
-for band 5:5-7 connectors => Low
-for band 6:8-10 connectors => Medium
-for band 7:10-12 connectors => Medium
-for band 8:13-15 connectors => High
-for band 9:>16 connectors => High
-3. Repeated Words: Classify as Low/Medium/High based on the number of repeated nouns/verbs.
-Low: 0-3 repeated words for band 9 and 8
-Medium: 4-5 repeated words for band 7, 6, 5
-High: 6+ repeated words for band 4, 3
-Double-check the essay to ensure consistency when evaluating the same essay multiple times.
-4. Advanced Vocabulary: Low/Medium/Advanced (double-check to ensure the same result on the same essay) (advanced vocabulary determined by the complexity of the terms used in the essay)
-Low: <3 advanced words for band 3, 4
-Medium: 5 <= advanced words <= 10 for band 5, 6, 7
-Advanced: >=11 advanced words (must use more than 12 words for band 9) for band 8, 9
-Double-check the essay to ensure consistency when evaluating the same essay multiple times.
-
-5. Lexical Diversity: Low/Medium/Advanced (calculate Lexical Density:
-    * Count all words in the essay.
-    * Classify each word as either a CONTENT word (noun, verb, adjective, adverb) or a FUNCTION word (article, preposition, conjunction, pronoun, auxiliary verb). If a word can be both, consider its usage in the context.
-    * Calculate Lexical Density = (Number of Content Words) / (Total Number of Words)
-    * Provide the Lexical Density score as a decimal number between 0 and 1 (e.g., 0.55).
-    * Also, indicate whether the Lexical Diversity is Low, Medium, or High based on these ranges:
-        * Low: Lexical Density < 0.40 for band 3, 4
-        * Medium: 0.40 <= Lexical Density < 0.60 for band 5, 6, 7
-        * High: Lexical Density >= 0.60 for band 8, 9
-6. Avg Sentence Length: Short (5-10) / Medium (11-20) / Long (20+) (calculate with Average Sentence Length = Total Number of Words / Total Number of Sentences)
-Short: 5-10 words per sentence for band 3, 4
-Medium: 11-20 words per sentence for band 5, 6, 7
-Long: 20+ words per sentence for band 8, 9
-7. Predicted Band: 3-9 (decimal can be included, e.g., 9.0)
-
-Score calculation to update the essay:
-Grammar Issues:
-Excellent: 5
-Good: 4
-Fair: 3
-Poor: 2
-
-Connector Count:
-Low: 2
-Medium: 4
-High: 5
-
-Repeated Words:
-Low: 5
-Medium: 4
-High: 3
-
-Advanced Vocabulary:
-Low: 2
-Medium: 4
-Advanced: 5
-
-Lexical Diversity:
-Low: 2
-Medium: 4
-High: 5
-
-Average Sentence Length:
-Short: 3
-Medium: 4
-Long: 5
-
-Breakdown for Band Ranges:
-Band 3 (3.0 - 4.5): Score: 6 to 15 points
-Band 4 (4.0 - 5.0): Score: 16 to 19 points
-Band 5 (5.0 - 6.0): Score: 20 to 22 points
-Band 6 (6.0 - 6.5): Score: 23 to 24 points
-Band 7 (7.0 - 8.0): Score: 25 to 27 points
-Band 8 (8.0 - 9.0): Score: 28 to 29 points
-Band 9 (9.0): Score: 30 points
-
-- Don’t show results, show only a plain essay based on the above rules. Do not include analysis or additional comments (e.g., Grammar Issues: Excellent, Predicted Band: 9.0).
-- Before generating the essay, check with the rules and score to ensure it matches the exact band score generated in the analysis result.
+- The essay will be analyzed with the rules below. Write it so the analysis gives exactly these results:
+{rubric.target_text(band)}
+
+Analysis rules:
+{rubric.criteria_text()}
+
+- Show only a plain essay. Do not include analysis or additional comments (e.g., Grammar Issues: Excellent, Predicted Band: 9.0).
 - Output: Plain text only. Do not include explanations or additional comments."""
     try:
-        response = with_retries(lambda: client.models.generate_content(
-            model="gemini-2.0-flash",
+        response = await with_retries(lambda: gateway.generate(
+            task='essay',
+            site='generate_essay',
             contents=prompt
         ))
         return response.text.replace("**", "").strip()
+    except BackendUnavailable:
+        return f"⚠️ {BACKEND_DOWN_MESSAGE}"
     except Exception as e:
         return f"⚠️ Error: {str(e)}"
 
+# Best-of-N generation: N candidates run concurrently and are scored locally
+BEST_OF_N = 1                   # 1 disables; e.g. 3 trades extra calls for band accuracy
+BEST_OF_TOLERANCE = 2           # return the first candidate this close to the band's targets
+best_of_stats = {'runs': 0, 'candidates_scored': 0, 'early_exits': 0, 'cancelled_candidates': 0}
+
+async def generate_essay_best_of(topic, band, n=BEST_OF_N):
+    if n <= 1 or not brownout.allows('speculative'):
+        return await generate_essay(topic, band)
+    best_of_stats['runs'] += 1
+    tasks = [asyncio.ensure_future(generate_essay(topic, band)) for _ in range(n)]
+    best = None
+    essay = None
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            essay = await next_done
+            if essay.startswith("⚠️"):
+                continue
+            distance = band_distance(essay, band)
+            best_of_stats['candidates_scored'] += 1
+            if best is None or distance < best[0]:
+                best = (distance, essay)
+            if distance <= BEST_OF_TOLERANCE:
+                best_of_stats['early_exits'] += 1
+                break
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                best_of_stats['cancelled_candidates'] += 1
+    return best[1] if best else essay
+
+async def _generate_for_pool(topic, band):
+    essay = await generate_essay(topic, band)
+    return None if essay.startswith("⚠️") else essay
+
+# Pre-generated essays for popular (topic, band) pairs, refilled off-peak
+essay_pool = EssayPool(_generate_for_pool)
+
+# Previously generated essays, matched on topic similarity rather than exact text
+topic_cache = TopicIndex()
+
+# MinHash/LSH index of analyzed essays, for near-duplicate resubmissions
+analysis_cache = NearDuplicateIndex()
+
 async def analyze_essay(essay, band=None):
+    with metrics.timed("local_checks"):
+        local_check = spellcheck.check(essay, spell_index)
+        vocabulary = lexicon.profile(essay)
+    if not brownout.allows('llm_analysis'):
+        return local_estimate(essay, local_check, vocabulary)
+    analysis_task = 'light' if len(essay.split()) <= LIGHT_ANALYSIS_MAX_WORDS else 'analysis'
     prompt = f"""ANALYZE THIS ESSAY STRICTLY FOLLOWING THESE RULES:
 ESSAY:
-{essay}
-
-1. Grammar Issues: Determined by the number of misspellings and grammatical errors.
-- Classify the grammar quality of the essay as:
-  - Excellent: 0-1 minor errors
-  - Good: 2-3 minor errors
-  - Fair: 4-5 errors or noticeable grammar issues
-  - Poor: 6+ errors or significant grammar problems
-  - Double-check the essay to ensure consistency when evaluating the same essay multiple times.
-
-2. Connector Count: Classify as Low/Medium/High based on the number of connectors (e.g., however, furthermore, and).
-- Classify based on the number of connectors (e.g., "however," "furthermore," "and") (count conjunction words):
-  - Low: 0-5 connectors
-  - Medium: 6-12 connectors
-  - High: 13+ connectors
-  - Double-check the essay to ensure consistency.
-
-3. Repeated Words: Classify as Low/Medium/High based on the number of repeated nouns/verbs.
-- Low: 0-2 repeated words
-- Medium: 3-4 repeated words
-- High: 5+ repeated words
-- Double-check the essay to ensure consistency.
-
-4. Advanced Vocabulary: Low/Medium/Advanced (double-check for consistency).
-- Advanced Vocabulary is determined by the complexity of the terms used in the essay:
-  - Low: Frequent use of simple words
-  - Medium: A mix of everyday and slightly more advanced terms
-  - Advanced: Use of sophisticated terms, formal language, and specialized vocabulary
-- Double-check the essay to ensure consistency.
-
-5. Lexical Diversity: Low/Medium/High (calculate Lexical Density):
-  - Count all words in the essay.
-  - Classify each word as either a CONTENT word (noun, verb, adjective, adverb) or a FUNCTION word (article, preposition, conjunction, pronoun, auxiliary verb). If a word can be both, consider its usage in the context.
-  - Calculate Lexical Density = (Number of Content Words) / (Total Number of Words)
-  - Provide the Lexical Density score as a decimal number between 0 and 1 (e.g., 0.55).
-  - Indicate whether the Lexical Diversity is:
-    - Low: Lexical Density < 0.40
-    - Medium: 0.40 <= Lexical Density < 0.60
-    - High: Lexical Density >= 0.60
-
-6. Avg Sentence Length: Short (5-10) / Medium (11-20) / Long (20+) (calculate with Average Sentence Length = Total Number of Words / Total Number of Sentences):
-  - Short: 5-10 words per sentence
-  - Medium: 11-20 words per sentence
-  - Long: 20+ words per sentence
-
-7. Predicted Band: 3-9 (decimal can be included, e.g., 9.0)
-
-Score calculation to determine the band:
-- Grammar Issues:
-  - Excellent: 5
-  - Good: 4
-  - Fair: 3
-  - Poor: 2
-- Connector Count:
-  - Low: 2
-  - Medium: 4
-  - High: 5
-- Repeated Words:
-  - Low: 5
-  - Medium: 4
-  - High: 3
-- Advanced Vocabulary:
-  - Low: 2
-  - Medium: 4
-  - Advanced: 5
-- Lexical Diversity:
-  - Low: 2
-  - Medium: 4
-  - High: 5
-- Average Sentence Length:
-  - Short: 3
-  - Medium: 4
-  - Long: 5
-
-Breakdown for Band Ranges:
-- Band 3 (3.0 - 4.5): Score: 6 to 15 points
-- Band 4 (4.0 - 5.0): Score: 16 to 19 points
-- Band 5 (5.0 - 6.0): Score: 20 to 22 points
-- Band 6 (6.0 - 6.5): Score: 23 to 24 points
-- Band 7 (7.0 - 8.0): Score: 25 to 27 points
-- Band 8 (8.0 - 9.0): Score: 28 to 29 points
-- Band 9 (9.0): Score: 30 points
-
-8. Band Prediction Criteria (if they meet these criteria):
-- Band 9:
-  - 'vocab': "Sophisticated terms (paradigm shift, socioeconomic)"
-  - 'structure': "Complex sentences with subordinate clauses"
-  - 'cohesion': "Advanced transitions (consequently, furthermore)"
-  - 'errors': "Virtually error-free"
-  - 'length': "300+ words"
-- Band 8:
-  - 'vocab': "Advanced terms (globalization, contemporary)"
-  - 'structure': "Varied complex structures"
-  - 'cohesion': "Effective linking (however, moreover)"
-  - 'errors': "Rare minor errors"
-  - 'length': "280+ words"
-- Band 7:
-  - 'vocab': "Adequate range (significant, development)"
-  - 'structure': "Mix of simple/complex sentences"
-  - 'cohesion': "Clear paragraphing"
-  - 'errors': "Some errors"
-  - 'length': "250+ words"
-- Band 6:
-  - 'vocab': "Basic academic terms"
-  - 'structure': "Simple structures with some complexity"
-  - 'cohesion': "Basic connectors (and, but)"
-  - 'errors': "Noticeable errors"
-  - 'length': "250 words"
-- Band 5:
-  - 'vocab': "Limited range (good, things)"
-  - 'structure': "Mostly simple sentences"
-  - 'cohesion': "Few connectors"
-  - 'errors': "Frequent errors"
-  - 'length': "200 words"
-- Band 4:
-  - 'vocab': "Basic vocabulary (school, job)"
-  - 'structure': "Short simple sentences"
-  - 'cohesion': "Minimal linking"
-  - 'errors': "Systematic errors"
-  - 'length': "150 words"
-- Band 3:
-  - 'vocab': "Very basic terms (study, work)"
-  - 'structure': "Fragmented sentences"
-  - 'cohesion': "No connectors"
-  - 'errors': "Severe errors"
-  - 'length': "<100 words"
-
-9. Recheck the essay three (3) exact times with the above rules and guidelines. The analysis must be consistent across all checks.
+{number_paragraphs(split_paragraphs(essay))}
+
+{rubric.criteria_text()}
+
+{local_check_hint(local_check)}
+{vocabulary_hint(vocabulary)}
 
 FORMAT Must be EXACTLY LIKE THIS (no extra information):
-Grammar Issues: [Excellent/Good/Fair/Poor]
-Advanced Vocabulary: [Low/Medium/Advanced]
-Connector Count: [Low/Medium/High]
-Repeated Words: [Low/Medium/High]
-Lexical Diversity: [Low/Medium/High]
-Avg Sentence Length: [Short/Medium/Long]
-Predicted IELTS Band: [3-9] (whole number or decimal, e.g., 9.0)
+{rubric.format_text()}
+{PARAGRAPH_COUNTS_FORMAT}
 """
     try:
-        response = with_retries(lambda: client.models.generate_content(
-            model="gemini-2.0-flash",
+        response = await with_retries(lambda: gateway.generate(
+            task=analysis_task,
+            site='analyze_essay',
             contents=prompt
         ))
-        return parse_analysis(response.text)
+        with metrics.timed("parse_analysis"):
+            analysis = parse_analysis(response.text)
+        if GRAMMAR_FROM_LOCAL_CHECK and local_check['spelling_checked']:
+            analysis["Grammar Issues"] = rubric.classify("Grammar Issues", local_check['total'])
+        if VOCABULARY_FROM_LEXICON:
+            analysis["Advanced Vocabulary"] = rubric.classify("Advanced Vocabulary", vocabulary['advanced_count'])
+        # The band is computed from the labels, not taken from the model
+        analysis = rubric.apply_band(analysis)
+        if analysis["Predicted IELTS Band"] != "N/A":
+            analysis_cache.add(essay, analysis)
+        analysis["Paragraph Counts"] = parse_paragraph_counts(response.text)
+        return analysis
+    except BackendUnavailable:
+        return local_estimate(essay, local_check, vocabulary)
     except Exception as e:
-        print(f"Analysis error: {e}")
+        log.error("Analysis error: %s", e)
         return None
 
+def local_estimate(essay, local_check, vocabulary):
+    # From the offline checks alone: the backend is down or browned out
+    analysis = local_analysis(essay, local_check['total'], vocabulary['advanced_count'])
+    analysis["Source"] = "local"
+    return analysis
+
+# Offline spelling/grammar pre-pass; spelling needs an index built with spellcheck.py
+spell_index = spellcheck.load_index()
+GRAMMAR_FROM_LOCAL_CHECK = False  # True: Grammar Issues comes from the local count alone
+LOCAL_CHECK_HINT_ERRORS = 15
+
+def local_check_hint(local_check):
+    kinds = "spelling and grammar" if local_check['spelling_checked'] else "rule-based grammar"
+    found = "; ".join(message for _, _, _, message in local_check['errors'][:LOCAL_CHECK_HINT_ERRORS])
+    return (f"LOCAL CHECK: an offline {kinds} checker already found {local_check['total']} error(s)"
+            f"{': ' + found if found else ''}. Count these toward Grammar Issues together with any other errors you find.")
+
+# Local advanced-vocabulary count from the lexicon
+VOCABULARY_FROM_LEXICON = False  # True: Advanced Vocabulary comes from the lexicon count alone
+
+def vocabulary_hint(vocabulary):
+    if not vocabulary['advanced']:
+        return "LOCAL VOCABULARY: no advanced words were found by the offline lexicon."
+    return (f"LOCAL VOCABULARY: the offline lexicon found {vocabulary['advanced_count']} advanced word(s): "
+            f"{', '.join(vocabulary['advanced'])}. Use this as the starting point for Advanced Vocabulary.")
+
+# Paragraph-level grammar/vocabulary counts, so revisions only re-send changed paragraphs
+PARAGRAPH_COUNTS_FORMAT = """Paragraph [n]: Grammar Errors: [count], Advanced Words: [count] (one line per numbered paragraph [P1], [P2], ... in order; Grammar Errors counts misspellings and grammatical errors, Advanced Words counts sophisticated or academic terms)"""
+
+def number_paragraphs(paragraphs):
+    return "\n\n".join(f"[P{i}] {p}" for i, p in enumerate(paragraphs, 1))
+
+def parse_paragraph_counts(text):
+    found = re.findall(r"Paragraph\s*\[?P?(\d+)\]?:\s*Grammar Errors:\s*\[?(\d+)\]?,?\s*Advanced Words:\s*\[?(\d+)", text)
+    counts = {int(n): (int(errors), int(advanced)) for n, errors, advanced in found}
+    if sorted(counts) != list(range(1, len(counts) + 1)):
+        return None
+    return [counts[n] for n in sorted(counts)]
+
+async def analyze_revision(essay, record, previous):
+    # Re-score a revised essay, sending only the paragraphs that changed to the model
+    paragraphs, reused = diff_paragraphs(essay, record)
+    changed = [p for p, entry in zip(paragraphs, reused) if entry is None]
+    if not paragraphs or len(changed) == len(paragraphs):
+        return None
+    if not changed and len(paragraphs) == len(record):
+        return previous, record
+    counts = []
+    if changed:
+        prompt = f"""For each numbered paragraph below, count misspellings and grammatical errors, and count advanced vocabulary (sophisticated terms, formal language, specialized vocabulary).
+
+FORMAT Must be EXACTLY LIKE THIS (no extra information):
+{PARAGRAPH_COUNTS_FORMAT}
+
+PARAGRAPHS:
+{number_paragraphs(changed)}"""
+        response = await with_retries(lambda: gateway.generate(
+            task='light',
+            site='analyze_revision',
+            contents=prompt
+        ))
+        counts = parse_paragraph_counts(response.text)
+        if counts is None or len(counts) != len(changed):
+            return None
+    new_counts = iter(counts)
+    new_record = []
+    for paragraph, entry in zip(paragraphs, reused):
+        if entry is None:
+            grammar_errors, advanced_words = next(new_counts)
+            entry = {
+                'hash': paragraph_hash(paragraph),
+                'metrics': paragraph_metrics(paragraph),
+                'grammar_errors': grammar_errors,
+                'advanced_words': advanced_words,
+            }
+        new_record.append(entry)
+    return revise_analysis(previous, record, new_record), new_record
+
+async def analyze_with_record(essay, band, record, previous=None):
+    # Returns (analysis, paragraph record); the record is None when it can't be built.
+    # previous is the session's analysis that the record belongs to
+    # Resubmissions with small edits reuse the earlier analysis
+    duplicate = analysis_cache.lookup(essay)
+    if duplicate is not None:
+        return duplicate, local_record(essay, record)
+    if record and previous and brownout.level < FEATURE_LEVELS['llm_analysis']:
+        try:
+            revised = await analyze_revision(essay, record, previous)
+            if revised is not None:
+                if revised[0]["Predicted IELTS Band"] != "N/A":
+                    analysis_cache.add(essay, revised[0])
+                return revised
+        except Exception as e:
+            log.error("Incremental analysis error: %s", e)
+    analysis = await analyze_essay(essay, band)
+    if not analysis:
+        return analysis, None
+    counts = analysis.pop("Paragraph Counts", None)
+    return analysis, build_record(essay, counts)
+
+def local_record(essay, record=None):
+    # Paragraph record for an essay without calling the model: entries of unchanged
+    # paragraphs are reused, the rest are counted with the offline checks
+    paragraphs, reused = diff_paragraphs(essay, record)
+    counts = [
+        (entry['grammar_errors'], entry['advanced_words']) if entry is not None
+        else (spellcheck.check(paragraph, spell_index)['total'], lexicon.profile(paragraph)['advanced_count'])
+        for paragraph, entry in zip(paragraphs, reused)
+    ]
+    return build_record(essay, counts)
+
 def parse_analysis(text):
     metrics = {}
     # Use regex for more robust parsing
@@ -458,6 +680,7 @@ def parse_analysis(text):
     return metrics
 
 async def create_visualization(metrics):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(10, 8))
     plt.subplot(polar=True)
     
@@ -561,7 +784,18 @@ async def show_analysis(update, context, generated=False):
     band = context.user_data.get('band') if generated else None
     
     processing = await update.message.reply_text("🔍 Analyzing...")
-    analysis = await analyze_essay(essay, band)
+    with metrics.timed("analysis"):
+        result = await run_cancellable(update, analyze_with_record(
+            essay, band, context.user_data.get('paragraph_record'), context.user_data.get('analysis')))
+    if result is CANCELLED:
+        try:
+            await processing.delete()
+        except Exception as e:
+            log.warning("Cleanup error: %s", e)
+        return SELECT_OPTION
+    analysis, record = result
+    # The record and the analysis are kept as a pair for the next revision
+    context.user_data['paragraph_record'] = record
     await show_members_and_meme(update)
     
     if not analysis:
@@ -570,6 +804,7 @@ async def show_analysis(update, context, generated=False):
         return SELECT_OPTION
 
     context.user_data['analysis'] = analysis
+    start_prefetch(update, context, essay)
    
     result_text = (
         "📊 Detailed Analysis:\n"
@@ -581,17 +816,20 @@ async def show_analysis(update, context, generated=False):
         f"├ Avg Sentence Length: {analysis['Avg Sentence Length']}\n"
         f"└ Predicted Band: {analysis['Predicted IELTS Band']}\n"
     )
+    if analysis.get("Source") == "local":
+        result_text += "\nℹ️ Quick offline estimate: the full analysis is temporarily unavailable.\n"
 
-    try:
-        buf = await create_visualization(analysis)
-    except Exception as e:
-        print(f"Visualization error: {e}")
-        buf = None
+    buf = None
+    if brownout.allows('chart'):
+        try:
+            with metrics.timed("visualization"):
+                buf = await create_visualization(analysis)
+        except Exception as e:
+            log.error("Visualization error: %s", e)
 
-    keyboard = [
-        [InlineKeyboardButton("Grammar Recommendations", callback_data='grammar_rec')],
-        [InlineKeyboardButton("Home🏡", callback_data='restart')]
-    ]
+    keyboard = [[InlineKeyboardButton("Home🏡", callback_data='restart')]]
+    if brownout.allows('llm_followups'):
+        keyboard.insert(0, [InlineKeyboardButton("Grammar Recommendations", callback_data='grammar_rec')])
     await processing.delete()
     if buf:
         await update.message.reply_photo(
@@ -604,25 +842,17 @@ async def show_analysis(update, context, generated=False):
             reply_markup=InlineKeyboardMarkup(keyboard))
     return SELECT_OPTION
 
+@metrics.track_handler
 async def process_essay(update: Update, context):
     context.user_data['current_essay'] = update.message.text
     return await show_analysis(update, context)
 
-async def handle_recommendations(update: Update, context):
-    query = update.callback_query
-    await query.answer()
-    essay = context.user_data.get("current_essay", "")
-    analysis = context.user_data.get("analysis", {})
-    
-    if not essay:
-        await query.edit_message_text("⚠️ No essay found")
-        return SELECT_OPTION
-
-    if query.data == 'grammar_rec':
-        prompt = f"""Analyze this essay and provide grammar recommendations:
+async def grammar_recommendations(essay, hedge=True):
+    vocabulary = lexicon.profile(essay)
+    prompt = f"""Analyze this essay and provide grammar recommendations:
 - List connector count and suggest improvements
 - Highlight repeated words with counts
-- Identify advanced vocabulary usage
+- Identify advanced vocabulary usage (already found: {', '.join(vocabulary['advanced']) or 'none'}; add any others)
 
 - Format exactly as:
 
@@ -649,21 +879,51 @@ Recommended: convenient (e.g., "good for my life" → "convenient for my life")
 ------------------------------------------------------------------------------
 Essay:
 {essay}"""
+    return await with_retries(lambda: gateway.generate(
+        task='analysis',
+        site='grammar_recommendations',
+        contents=prompt,
+        hedge=hedge
+    ))
+
+@metrics.track_handler
+async def handle_recommendations(update: Update, context):
+    query = update.callback_query
+    await query.answer()
+    essay = context.user_data.get("current_essay", "")
+    analysis = context.user_data.get("analysis", {})
+    
+    if not essay:
+        await query.edit_message_text("⚠️ No essay found")
+        return SELECT_OPTION
+
+    if query.data == 'grammar_rec':
         try:
-            response = with_retries(lambda: client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt
-            ))
-            rec_text = response.text.replace("**", "").strip()
+            rec_text = await take_prefetched_recommendations(context.user_data, essay)
+            if rec_text is CANCELLED:
+                return SELECT_OPTION
+            if rec_text is None and not brownout.allows('llm_followups'):
+                await query.message.reply_text(BROWNOUT_FOLLOWUP_MESSAGE)
+                return SELECT_OPTION
+            if rec_text is None:
+                response = await run_cancellable(update, grammar_recommendations(essay))
+                if response is CANCELLED:
+                    return SELECT_OPTION
+                rec_text = response.text.replace("**", "").strip()
             await query.message.reply_text(
                 f"🔍 Grammar Recommendations:\n\n{rec_text}",
                 reply_markup=InlineKeyboardMarkup([
                     [InlineKeyboardButton("Home🏡", callback_data='restart')]
                 ])
             )
+        except BackendUnavailable:
+            await query.message.reply_text(BACKEND_DOWN_MESSAGE)
         except Exception as e:
             await query.message.reply_text(f"❌ Error: {str(e)}")
     elif query.data == 'refine':
+        if not brownout.allows('llm_followups'):
+            await query.message.reply_text(BROWNOUT_FOLLOWUP_MESSAGE)
+            return SELECT_OPTION
         try:
             current_band = float(analysis.get('Predicted IELTS Band', 7))
         except:
@@ -675,98 +935,25 @@ Essay:
 - Reduce repeats: {analysis.get('Repeated Words', 'Low')} instances
 - Add connectors: Current {analysis.get('Connector Count', 'Low')}
 - Enhance vocabulary: {analysis.get('Advanced Vocabulary', 'Low')}
--with these rules
-1. Grammar Issues: Give ONLY Excellent/Good/Fair/Poor
--Classify the grammar quality of the essay as:
-Excellent: 0-1 minor errors
-Good: 2-3 minor errors
-Fair: 4-5 errors or noticeable grammar issues
-Poor: 6+ errors or significant grammar problems
-Double-check the essay to ensure consistency when evaluating the same essay multiple times.
-
-2. Connector Count: Classify as Low/Medium/High based on the number of connectors (e.g., however, furthermore, and).
-Classify the essay based on the number of connectors (e.g., "however," "furthermore," "and"):
-Low: 0-5 connectors
-Medium: 6-12 connectors
-High: 13+ connectors
-Double-check the essay to ensure consistency when evaluating the same essay multiple times.
-
-3. Repeated Words: Classify as Low/Medium/High based on the number of repeated nouns/verbs.
-Low: 0-2 repeated words
-Medium: 3-4 repeated words
-High: 5+ repeated words
-Double-check the essay to ensure consistency when evaluating the same essay multiple times.
-
-4. Advanced Vocabulary: Low/Medium/Advanced (double-check for consistency).
-- Advanced Vocabulary is determined by the complexity of the terms used in the essay:
-  - Low: Frequent use of simple words
-  - Medium: A mix of everyday and slightly more advanced terms
-  - Advanced: Use of sophisticated terms, formal language, and specialized vocabulary
-- Double-check the essay to ensure consistency when evaluating the same essay multiple times.
-
-5. Lexical Diversity: Low/Medium/High (calculate Lexical Density):
-  - Count all words in the essay.
-  - Classify each word as either a CONTENT word (noun, verb, adjective, adverb) or a FUNCTION word (article, preposition, conjunction, pronoun, auxiliary verb). If a word can be both, consider its usage in the context.
-  - Calculate Lexical Density = (Number of Content Words) / (Total Number of Words)
-  - Provide the Lexical Density score as a decimal number between 0 and 1 (e.g., 0.55).
-  - Indicate whether the Lexical Diversity is:
-    - Low: Lexical Density < 0.40
-    - Medium: 0.40 <= Lexical Density < 0.60
-    - High: Lexical Density >= 0.60
-
-6. Avg Sentence Length: Short (5-10) / Medium (11-20) / Long (20+) (calculate with Average Sentence Length = Total Number of Words / Total Number of Sentences):
-  - Short: 5-10 words per sentence
-  - Medium: 11-20 words per sentence
-  - Long: 20+ words per sentence
-
-7. Predicted Band: 3-9 (decimal can be included, e.g., 9.0)
-
-Score calculation to update the essay:
-- Grammar Issues:
-  - Excellent: 5
-  - Good: 4
-  - Fair: 3
-  - Poor: 2
-- Connector Count:
-  - Low: 2
-  - Medium: 4
-  - High: 5
-- Repeated Words:
-  - Low: 5
-  - Medium: 4
-  - High: 3
-- Advanced Vocabulary:
-  - Low: 2
-  - Medium: 4
-  - Advanced: 5
-- Lexical Diversity:
-  - Low: 2
-  - Medium: 4
-  - High: 5
-- Average Sentence Length:
-  - Short: 3
-  - Medium: 4
-  - Long: 5
-
-Breakdown for Band Ranges:
-- Band 3 (3.0 - 4.5): Score: 6 to 15 points
-- Band 4 (4.0 - 5.0): Score: 16 to 19 points
-- Band 5 (5.0 - 6.0): Score: 20 to 22 points
-- Band 6 (6.0 - 6.5): Score: 23 to 24 points
-- Band 7 (7.0 - 8.0): Score: 25 to 27 points
-- Band 8 (8.0 - 9.0): Score: 28 to 29 points
-- Band 9 (9.0): Score: 30 points
-
-- Don’t show results, show only a plain essay based on the above rules. Do not include analysis or additional comments (e.g., Grammar Issues: Excellent, Predicted Band: 9.0).
+- The improved essay will be analyzed with the rules below. Write it so the analysis gives exactly these results:
+{rubric.target_text(target_band)}
+
+Analysis rules:
+{rubric.criteria_text()}
+
+- Show only a plain essay. Do not include analysis or additional comments (e.g., Grammar Issues: Excellent, Predicted Band: 9.0).
 - Output: Plain text only. Do not include explanations or additional comments.
 
 Output ONLY the refined essay:
 {essay}"""
         try:
-            response = with_retries(lambda: client.models.generate_content(
-                model="gemini-2.0-flash",
+            response = await run_cancellable(update, with_retries(lambda: gateway.generate(
+                task='refine',
+                site='refine',
                 contents=prompt
-            ))
+            )))
+            if response is CANCELLED:
+                return SELECT_OPTION
             refined = response.text.replace("**", "").strip()
             context.user_data['current_essay'] = refined
             await query.message.reply_text(
@@ -775,35 +962,56 @@ Output ONLY the refined essay:
                     [InlineKeyboardButton("Home🏡", callback_data='restart')]
                 ])
             )
+        except BackendUnavailable:
+            await query.message.reply_text(BACKEND_DOWN_MESSAGE)
         except Exception as e:
             await query.message.reply_text(f"❌ Refine failed: {str(e)}")
     
     return SELECT_OPTION
 
+GIF_DISPLAY_SECONDS = 6
+LOADING_ANIMATION = "https://tenor.com/bqYoH.gif"
+MEME_ANIMATION = "https://tenor.com/buads.gif"
+animation_file_ids = {}     # URL -> Telegram file_id, so Telegram doesn't fetch the GIF again
+
+async def reply_animation(update: Update, url):
+    message = await update.message.reply_animation(animation_file_ids.get(url, url))
+    if message.animation is not None:
+        animation_file_ids.setdefault(url, message.animation.file_id)
+    return message
+
 async def show_members_and_meme(update: Update):
+    if not brownout.allows('animations'):
+        return
     # Show members message first
-    members_message = await update.message.reply_animation(
-        "https://tenor.com/bqYoH.gif"
-    )
-    await asyncio.sleep(6)
+    members_message = await reply_animation(update, LOADING_ANIMATION)
+    with metrics.timed("gif_wait"):
+        await asyncio.sleep(GIF_DISPLAY_SECONDS)
     await members_message.delete()
 
     # Send meme GIF
-    meme_url = "https://tenor.com/buads.gif"
-    await update.message.reply_animation(meme_url)
+    await reply_animation(update, MEME_ANIMATION)
 
 async def loading(update: Update):
+    if not brownout.allows('animations'):
+        return
     # Show members message first
-    loading = await update.message.reply_animation(
-        "https://tenor.com/bqYoH.gif"
-    )
-    await asyncio.sleep(6)
+    loading = await reply_animation(update, LOADING_ANIMATION)
+    with metrics.timed("gif_wait"):
+        await asyncio.sleep(GIF_DISPLAY_SECONDS)
     await loading.delete()
 
+@metrics.track_handler
 async def restart_program(update: Update, context):
     query = update.callback_query
     await query.answer()
+    discard_prefetch(context.user_data)
+    cancel_inflight(update.effective_chat.id)
+    # The last analysis and its paragraph record survive Home, so a revised
+    # essay is still re-scored incrementally
+    kept = {key: context.user_data[key] for key in ('analysis', 'paragraph_record') if key in context.user_data}
     context.user_data.clear()
+    context.user_data.update(kept)
     # Send as new message instead of editing
     await query.message.reply_text(
         text="🏠 Main Menu:",
@@ -815,8 +1023,184 @@ async def restart_program(update: Update, context):
     )
     return SELECT_OPTION
 
-def main():
-    application = Application.builder().token("add your bot token ").build()
+# Telegram Bot API connection pool and timeouts (seconds)
+TELEGRAM_POOL_SIZE = 64
+TELEGRAM_POOL_TIMEOUT = 5.0
+TELEGRAM_CONNECT_TIMEOUT = 5.0
+TELEGRAM_READ_TIMEOUT = 10.0
+TELEGRAM_WRITE_TIMEOUT = 20.0   # photo and chart uploads
+GEMINI_WARM_UP_TIMEOUT = 10.0
+
+UPDATE_CONCURRENCY = 256        # same as concurrent_updates(True); each update is traced and admitted
+
+# All Bot API calls go through one scheduler that respects Telegram's flood limits
+send_scheduler = SendScheduler()
+# Per-chat token buckets and in-flight caps for updates that start Gemini work
+update_processor = AdmissionUpdateProcessor(UPDATE_CONCURRENCY)
+
+# Sheds optional work (animations, charts, LLM follow-ups) while these run high
+BROWNOUT_SEND_QUEUE = 200       # queued Bot API requests that count as full pressure
+BROWNOUT_FOLLOWUP_MESSAGE = "🚦 Recommendations are paused while the assistant is busy. Please try again in a few minutes."
+
+def _gemini_latency_pressure():
+    # Recent p95 of the model each task is routed to now, against the task's budget;
+    # a model the router has demoted no longer counts
+    ratios = []
+    for task, budget in gateway.budgets.items():
+        stats = gateway.models.get((task, gateway.plan(task)[0]))
+        if stats is not None and stats.samples() >= ROUTER_MIN_SAMPLES:
+            ratios.append((stats.percentile(0.95) or 0.0) / budget)
+    return max(ratios, default=0.0)
+
+brownout = BrownoutController({
+    'inflight': lambda: update_processor.controller.inflight / ADMISSION_MAX_INFLIGHT,
+    'gemini_p95': _gemini_latency_pressure,
+    'send_queue': lambda: send_scheduler.queued / BROWNOUT_SEND_QUEUE,
+})
+
+# Component snapshots exported next to the histograms on the metrics endpoint
+metrics.REGISTRY.register_collector("essay_pool", essay_pool.snapshot)
+metrics.REGISTRY.register_collector("topic_cache", topic_cache.snapshot)
+metrics.REGISTRY.register_collector("analysis_cache", analysis_cache.snapshot)
+metrics.REGISTRY.register_collector("gateway", gateway.snapshot)
+metrics.REGISTRY.register_collector("send_scheduler", send_scheduler.snapshot)
+metrics.REGISTRY.register_collector("prefetch", lambda: prefetch_stats)
+metrics.REGISTRY.register_collector("best_of", lambda: best_of_stats)
+metrics.REGISTRY.register_collector("tracing", tracing.exporter.snapshot)
+metrics.REGISTRY.register_collector("admission", update_processor.controller.snapshot)
+metrics.REGISTRY.register_collector("brownout", brownout.snapshot)
+metrics.REGISTRY.register_collector("warm_up", lambda: warm_up_report)
+metrics.REGISTRY.register_collector("logging", log_pipeline.snapshot)
+metrics.REGISTRY.register_collector("cancellable", lambda: {
+    'chats': len(inflight_tasks),
+    'tasks': sum(len(tasks) for tasks in inflight_tasks.values()),
+})
+
+background_tasks = set()
+
+startup_marks = {}  # phase -> seconds since IMPORT_STARTED
+
+def mark_startup(phase):
+    if phase not in startup_marks:
+        startup_marks[phase] = round(time.monotonic() - IMPORT_STARTED, 3)
+        metrics.startup_seconds.labels(phase).set(startup_marks[phase])
+        log.info("Startup: %s after %ss", phase, startup_marks[phase])
+
+async def note_first_update(update, context):
+    mark_startup("first_update")
+
+# Startup warm-up: first requests after a deploy should cost what later ones do
+WARM_UP_BEFORE_POLLING = True   # False: poll at once and warm up in the background
+WARM_UP_CHAT_ID = None          # chat (e.g. the operator's) used to pre-upload the animations; None skips
+WARM_UP_ESSAY = (
+    "Some people believe that governments should invest more in public transport. "
+    "In my opinion, this is a sensible policy because it reduces congestion and pollution.\n\n"
+    "However, others argue that the money would be better spent on roads."
+)
+warm_up_report = {}     # step -> seconds, or the error that step hit
+
+async def _warm_step(name, coro):
+    started = time.monotonic()
+    try:
+        await coro
+        warm_up_report[name] = round(time.monotonic() - started, 3)
+    except Exception as e:
+        warm_up_report[name] = f"failed: {e}"
+        log.warning("Warm-up step %s failed: %s", name, e)
+
+async def _warm_local():
+    # CPU-bound steps, one after another so they don't contend
+    await _warm_step("imports", asyncio.to_thread(import_heavy_modules))
+    mark_startup("heavy_imports")
+    # First figure: font cache, polar projection, PNG encoder
+    await _warm_step("chart", create_visualization(parse_analysis("")))
+    # Touch the memory-mapped indexes and fill the lexicon caches
+    await _warm_step("indexes", asyncio.to_thread(lambda: (
+        topic_cache.lookup(WARM_UP_ESSAY, 7),
+        spellcheck.check(WARM_UP_ESSAY, spell_index),
+        lexicon.profile(WARM_UP_ESSAY),
+        local_analysis(WARM_UP_ESSAY, 0, 0),
+    )))
+
+async def _gemini_warm_up():
+    warm = await asyncio.wait_for(gateway.warm_up(), GEMINI_WARM_UP_TIMEOUT)
+    log.info("Gemini warm-up: %d connection(s) ready", warm)
+
+async def _upload_animations(bot):
+    for url in (LOADING_ANIMATION, MEME_ANIMATION):
+        message = await bot.send_animation(WARM_UP_CHAT_ID, url, disable_notification=True)
+        animation_file_ids[url] = message.animation.file_id
+        await message.delete()
+
+async def warm_up(application):
+    metrics.set_ready(False, "warming up")
+    network = [_warm_step("gemini", _gemini_warm_up())]
+    if WARM_UP_CHAT_ID is not None:
+        network.append(_warm_step("animations", _upload_animations(application.bot)))
+    await asyncio.gather(_warm_local(), *network)
+    mark_startup("warm")
+    log.info("Warm-up done", extra={'steps': warm_up_report})
+    metrics.set_ready(True)
+    background_tasks.add(asyncio.create_task(gateway.keep_warm()))
+    essay_pool.seed()
+    background_tasks.add(asyncio.create_task(
+        essay_pool.run_worker(paused=lambda: not brownout.allows('speculative'))))
+
+async def on_startup(application):
+    try:
+        application.bot_data['metrics_server'] = await metrics.serve()
+        log.info("Metrics on http://%s:%s/metrics", metrics.METRICS_HOST, metrics.METRICS_PORT)
+    except OSError as e:
+        log.warning("Metrics endpoint unavailable: %s", e)
+    background_tasks.add(asyncio.create_task(metrics.monitor_loop_lag()))
+    background_tasks.add(asyncio.create_task(tracing.exporter.run()))
+    background_tasks.add(asyncio.create_task(brownout.run()))
+    # Telegram's connection is already open: initialize() calls getMe
+    if WARM_UP_BEFORE_POLLING:
+        await warm_up(application)
+    else:
+        background_tasks.add(asyncio.create_task(warm_up(application)))
+    mark_startup("polling")
+
+async def on_shutdown(application):
+    for task in background_tasks:
+        task.cancel()
+    server = application.bot_data.get('metrics_server')
+    if server is not None:
+        server.close()
+    topic_cache.flush()
+    log.info("Shutdown snapshot", extra={
+        'essay_pool': essay_pool.snapshot(),
+        'topic_cache': topic_cache.snapshot(),
+        'analysis_cache': analysis_cache.snapshot(),
+        'model_routing': gateway.snapshot(),
+        'send_scheduler': send_scheduler.snapshot(),
+    })
+
+def build_application(token="add your bot token ", request=None):
+    # request: a custom telegram.request.BaseRequest (e.g. the load test's fake Bot API)
+    builder = Application.builder().token(token)
+    if request is None:
+        builder = (
+            builder
+            .connection_pool_size(TELEGRAM_POOL_SIZE)
+            .pool_timeout(TELEGRAM_POOL_TIMEOUT)
+            .connect_timeout(TELEGRAM_CONNECT_TIMEOUT)
+            .read_timeout(TELEGRAM_READ_TIMEOUT)
+            .write_timeout(TELEGRAM_WRITE_TIMEOUT)
+            .http_version("2" if HTTP2_AVAILABLE else "1.1")
+        )
+    else:
+        builder = builder.request(request).get_updates_request(request)
+    # Concurrent updates let Home / /start reach the bot while an LLM call is running
+    application = (
+        builder
+        .rate_limiter(send_scheduler)
+        .concurrent_updates(update_processor)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler('start', start)],
         states={
@@ -830,10 +1214,23 @@ def main():
             PROCESS_ESSAY: [MessageHandler(filters.TEXT & ~filters.COMMAND, process_essay)],
             HANDWRITING_UPLOAD: [MessageHandler(filters.PHOTO, process_handwriting)]
         },
-        fallbacks=[CommandHandler('start', start)]
+        fallbacks=[
+            CommandHandler('start', start),
+            CallbackQueryHandler(restart_program, pattern='^restart$')
+        ]
     )
     application.add_handler(conv_handler)
-    application.run_polling()
+    application.add_handler(TypeHandler(Update, note_first_update), group=-1)
+    return application
+
+mark_startup("import")
+
+def main():
+    log_pipeline.setup()
+    try:
+        build_application().run_polling()
+    finally:
+        log_pipeline.shutdown()
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,58 @@
 import re
 import asyncio
+import logging
 import numpy as np
 from io import BytesIO
 from PIL import Image
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, MessageHandler, filters, ContextTypes
-from google import genai
+from llm import LLMGateway, http_options
+import log_pipeline
 
-# Initialize Gemini client with your API key
-client = genai.Client(api_key="YOUR_API_KEY")
+log = logging.getLogger(__name__)
+
+# Initialize Gemini client with your API key (on the first call; the SDK import is slow)
+def make_client():
+    from google import genai
+    return genai.Client(api_key="YOUR_API_KEY", http_options=http_options())
+
+gateway = LLMGateway(client_factory=make_client)
+LIGHT_OCR_MAX_BYTES = 300_000
+
+def enhance_image(img_bytes):
+    # Downscaled, low-pass filtered grayscale JPEG for OCR
+    with Image.open(BytesIO(img_bytes)) as img:
+        # Optimize image size
+        if img.width > 800:
+            img = img.resize((800, int(img.height * (800/img.width))))
+
+        # Convert to grayscale
+        img_gray = img.convert('L')
+        img_np = np.array(img_gray)
+
+        # Fast Fourier Transform processing
+        fft = np.fft.fft2(img_np)
+        fshift = np.fft.fftshift(fft)
+
+        # Create optimized low-pass filter
+        rows, cols = img_np.shape
+        crow, ccol = rows//2, cols//2
+        mask = np.zeros((rows, cols), np.uint8)
+        mask[crow-25:crow+25, ccol-25:ccol+25] = 1
+
+        # Apply frequency domain filtering
+        fshift *= mask
+        img_back = np.fft.ifft2(np.fft.ifftshift(fshift)).real
+
+        # Normalize and convert
+        img_back = ((img_back - img_back.min()) /
+                  (img_back.max() - img_back.min()) * 255)
+        enhanced_img = Image.fromarray(img_back.astype(np.uint8))
+
+        # Save as optimized JPEG
+        buffer = BytesIO()
+        enhanced_img.save(buffer, format="JPEG", quality=85)
+        return buffer.getvalue()
 
 async def process_handwriting(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
@@ -30,49 +74,18 @@ async def process_handwriting(update: Update, context: ContextTypes.DEFAULT_TYPE
 
         # Enhanced image processing with Fourier Transform
         try:
-            with Image.open(BytesIO(img_bytes)) as img:
-                # Optimize image size
-                if img.width > 800:
-                    img = img.resize((800, int(img.height * (800/img.width)))
-                
-                # Convert to grayscale
-                img_gray = img.convert('L')
-                img_np = np.array(img_gray)
-
-                # Fast Fourier Transform processing
-                fft = np.fft.fft2(img_np)
-                fshift = np.fft.fftshift(fft)
-                
-                # Create optimized low-pass filter
-                rows, cols = img_np.shape
-                crow, ccol = rows//2, cols//2
-                mask = np.zeros((rows, cols), np.uint8)
-                mask[crow-25:crow+25, ccol-25:ccol+25] = 1
-
-                # Apply frequency domain filtering
-                fshift *= mask
-                img_back = np.fft.ifft2(np.fft.ifftshift(fshift)).real
-                
-                # Normalize and convert
-                img_back = ((img_back - img_back.min()) / 
-                          (img_back.max() - img_back.min()) * 255)
-                enhanced_img = Image.fromarray(img_back.astype(np.uint8))
-
-                # Save as optimized JPEG
-                buffer = BytesIO()
-                enhanced_img.save(buffer, format="JPEG", quality=85)
-                image_data = buffer.getvalue()
-
+            image_data = enhance_image(img_bytes)
         except Exception as e:
-            print(f"🖼️ Image processing error: {e}")
+            log.warning("Image processing error: %s", e)
             image_data = img_bytes  # Fallback to original
 
         # Gemini API call with your credentials
         try:
-            response = client.models.generate_content(
-                model="gemini-1.5-flash",
+            from google.genai import types
+            response = await gateway.generate(
+                task='light' if len(image_data) <= LIGHT_OCR_MAX_BYTES else 'ocr',
                 contents=[
-                    {"mime_type": "image/jpeg", "data": image_data},
+                    types.Part.from_bytes(data=image_data, mime_type="image/jpeg"),
                     "Extract handwritten text EXACTLY as written. Preserve line breaks and punctuation."
                 ]
             )
@@ -87,7 +100,7 @@ async def process_handwriting(update: Update, context: ContextTypes.DEFAULT_TYPE
                 f"✍️ Extracted Text:\n\n{text}",
                 reply_markup=InlineKeyboardMarkup([
                     [InlineKeyboardButton("Retry", callback_data="retry")]
-                )
+                ])
             )
 
         except Exception as e:
@@ -97,6 +110,7 @@ async def process_handwriting(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text(f"⛔ Critical error: {str(e)[:300]}")
 
 if __name__ == "__main__":
+    log_pipeline.setup()
     # Initialize with your bot token
     application = Application.builder().token("YOUR_BOT_TOKEN").build()
     application.add_handler(MessageHandler(filters.PHOTO, process_handwriting))
@@ -0,0 +1,202 @@
+# Micro-benchmarks with performance budgets for the bot's hot functions
+#
+#   python benchmarks/bench_hot_paths.py                    # report against the baselines
+#   python benchmarks/bench_hot_paths.py --check            # exit 1 when a budget is exceeded
+#   python benchmarks/bench_hot_paths.py --only image --threshold 0.5
+#
+# Times parse_analysis, the _map_*_to_band helpers, create_visualization, the
+# Pillow convert/encode of app.process_handwriting and the FFT filter of
+# app_tw.enhance_image on representative inputs in several sizes. Reports the
+# median time and tracemalloc peak per case.
+#
+# Times are stored relative to a fixed calibration workload (regex, FFT and PNG
+# encode) timed just before each case, so baselines carry across machines; the
+# tracemalloc peaks are stored as they are. With --check, a case slower (or
+# hungrier) than baseline * (1 + threshold) fails the run. After an intentional
+# performance change, re-baseline and commit the file:
+#
+#   python benchmarks/bench_hot_paths.py --save-baseline
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+import app_tw
+from fakes import synthetic_essay
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_THRESHOLD = 0.5         # allowed slowdown over the baseline, as a fraction
+# Noisier cases get more room, keyed by the case name without its size label. The
+# microsecond pure-Python cases swing by up to 2x between runs on a shared host.
+THRESHOLDS = {
+    'parse_analysis': 1.0,
+    'map_to_band': 1.0,
+}
+MEMORY_THRESHOLD = 0.5          # allowed growth of the tracemalloc peak
+# preprocess_handwriting works on the full image, so its cost grows with size
+HANDWRITING_SIZES = {'small': (640, 480), 'medium': (1600, 1200), 'large': (4000, 3000)}
+# enhance_image filters at most 800 px wide: below that width the image is used
+# as is, above it the resize runs and the FFT size stays fixed
+ENHANCE_SIZES = {'native': (640, 480), 'downscaled': (3000, 2250)}
+CALIBRATION_REPEATS = 9
+ESSAY_WORDS = {'short': 150, 'medium': 300, 'long': 800}
+
+
+def handwriting_image(width, height, seed=0):
+    # White page with dark pen-like strokes, JPEG as Telegram delivers it
+    rng = np.random.default_rng(seed)
+    page = np.full((height, width), 245, np.uint8)
+    for row in range(height // 12, height, max(1, height // 30)):
+        thickness = max(1, height // 400)
+        mask = rng.random(width) < 0.6
+        page[row:row + thickness, mask] = rng.integers(20, 90)
+    page = np.clip(page.astype(np.int16) + rng.integers(-8, 8, page.shape), 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(page).convert("RGB").save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def analysis_text(words, seed=0):
+    # A model reply for an essay of this length: labels plus per-paragraph counts
+    rng = random.Random(seed)
+    paragraphs = max(3, words // 80)
+    lines = [
+        f"Grammar Issues: {rng.choice(['Excellent', 'Good', 'Fair', 'Poor'])}",
+        f"Advanced Vocabulary: {rng.choice(['Low', 'Medium', 'Advanced'])}",
+        f"Connector Count: {rng.choice(['Low', 'Medium', 'High'])}",
+        f"Repeated Words: {rng.choice(['Low', 'Medium', 'High'])}",
+        f"Lexical Diversity: {rng.choice(['Low', 'Medium', 'High'])}",
+        f"Avg Sentence Length: {rng.choice(['Short', 'Medium', 'Long'])}",
+        f"Predicted IELTS Band: {rng.choice(['5', '6.5', '7', '8'])}",
+    ]
+    lines += [f"Paragraph {i}: Grammar Errors: {rng.randint(0, 4)}, Advanced Words: {rng.randint(0, 6)}"
+              for i in range(1, paragraphs + 1)]
+    # The reply often quotes the essay back
+    return "\n".join(lines) + "\n\n" + synthetic_essay(rng, words=words, paragraphs=paragraphs)
+
+
+def map_all(metrics):
+    return (
+        app._map_grammar_to_band(metrics['Grammar Issues']),
+        app._map_vocab_to_band(metrics['Advanced Vocabulary']),
+        app._map_connectors_to_band(metrics['Connector Count']),
+        app._map_repeated_words_to_band(metrics['Repeated Words']),
+        app._map_lexical_to_band(metrics['Lexical Diversity']),
+        app._map_sentence_length_to_band(metrics['Avg Sentence Length']),
+    )
+
+
+def cases():
+    # (name, function, repeats, calls per repeat)
+    loop = asyncio.new_event_loop()
+    for label, words in ESSAY_WORDS.items():
+        text = analysis_text(words)
+        yield f"parse_analysis[{label}]", (lambda text=text: app.parse_analysis(text)), 30, 100
+    metrics = app.parse_analysis(analysis_text(300))
+    yield "map_to_band", (lambda: map_all(metrics)), 30, 2000
+    yield "create_visualization", (lambda: loop.run_until_complete(app.create_visualization(metrics))), 5, 1
+    for label, (width, height) in HANDWRITING_SIZES.items():
+        data = handwriting_image(width, height)
+        yield f"image.preprocess_handwriting[{label}]", (lambda data=data: app.preprocess_handwriting(data)), 5, 1
+    for label, (width, height) in ENHANCE_SIZES.items():
+        data = handwriting_image(width, height)
+        yield f"image.enhance_image[{label}]", (lambda data=data: app_tw.enhance_image(data)), 5, 1
+
+
+def calibration_ms():
+    # Machine speed reference: the same mix of Python, numpy and Pillow work as the cases
+    text = analysis_text(300)
+    page = np.random.default_rng(0).integers(0, 255, (256, 256), dtype=np.uint8)
+
+    def workload():
+        for _ in range(300):  # about as long as the numpy and Pillow part
+            app.parse_analysis(text)
+        np.fft.ifft2(np.fft.fft2(page))
+        Image.fromarray(page).save(BytesIO(), format="PNG")
+    return measure(workload, CALIBRATION_REPEATS)['median_ms']
+
+
+def measure(func, repeats, number=1):
+    # Each of the repeats times number calls, so microsecond cases clear the timer noise
+    func()  # warm caches, fonts, lazy imports
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - started) / number)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    times.sort()
+    return {'median_ms': times[len(times) // 2] * 1000, 'peak_kb': peak / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help=f"allowed slowdown fraction for every case (default {DEFAULT_THRESHOLD}, "
+                             f"with per-case overrides)")
+    parser.add_argument("--only", default="", help="run cases whose name contains this")
+    parser.add_argument("--check", action="store_true", help="exit 1 when a case exceeds its budget")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    failures = []
+    print(f"{'case':<40}{'ms':>10}{'units':>9}{'peak KB':>11}{'base units':>12}{'change':>9}")
+    for name, func, repeats, number in cases():
+        if args.only not in name:
+            continue
+        unit = calibration_ms()  # re-timed per case, as the machine's speed drifts during a run
+        result = measure(func, repeats, number)
+        result['relative'] = result['median_ms'] / unit
+        results[name] = result
+        base = baseline.get(name)
+        line = f"{name:<40}{result['median_ms']:>10.3f}{result['relative']:>9.3f}{result['peak_kb']:>11.0f}"
+        if base:
+            change = result['relative'] / base['relative'] - 1
+            threshold = args.threshold if args.threshold is not None else THRESHOLDS.get(name.split('[')[0], DEFAULT_THRESHOLD)
+            line += f"{base['relative']:>12.3f}{change:>+9.0%}"
+            if change > threshold:
+                failures.append(f"{name}: {change:+.0%} time (budget +{threshold:.0%})")
+                line += "  SLOWER"
+            if result['peak_kb'] > base['peak_kb'] * (1 + MEMORY_THRESHOLD) + 64:
+                failures.append(f"{name}: peak {result['peak_kb']:.0f} KB vs {base['peak_kb']:.0f} KB")
+                line += "  MEMORY"
+        print(line)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({**baseline, **{name: {k: round(v, 6) for k, v in r.items()} for name, r in results.items()}},
+                      f, indent=2, sort_keys=True)
+        print(f"Saved {len(results)} baselines to {args.baseline}")
+        return 0
+    if failures:
+        print("\nPerformance budget exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1 if args.check else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# Cold-start benchmark: import time and time-to-first-update of app.py
+#
+#   python benchmarks/bench_startup.py --runs 5 --target 1.0
+#
+# Each run is a fresh interpreter that imports app, builds the Application on
+# the fake Bot API (fakes.FakeBotRequest) with Gemini pointed at a local stub
+# (fakes.StubGeminiServer), initializes it, runs post_init (on_startup and its
+# warm-up, as run_polling would) and processes one /start update. Reports the median seconds from app's first line to each
+# startup milestone (app.startup_marks) and the slowest imports; exits with
+# status 1 when time-to-first-update misses the target.
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+async def _child():
+    import app
+    from telegram import Update
+    from fakes import FakeBotRequest, StubGeminiServer
+
+    stub = await StubGeminiServer(median=0.05, sigma=0.1).start()
+    app.GEMINI_BASE_URL = stub.base_url
+    application = app.build_application(token="1:bench", request=FakeBotRequest(latency=0))
+    await application.initialize()
+    # initialize() doesn't run post_init; run_polling does, and the warm-up lives there
+    await application.post_init(application)
+    chat = {'id': 1, 'type': "private"}
+    user = {'id': 1, 'is_bot': False, 'first_name': "bench"}
+    update = Update.de_json({'update_id': 1, 'message': {
+        'message_id': 1, 'date': 0, 'chat': chat, 'from': user, 'text': "/start",
+        'entities': [{'type': "bot_command", 'offset': 0, 'length': 6}]}}, application.bot)
+    await application.process_update(update)
+    await application.post_shutdown(application)
+    await application.shutdown()
+    await stub.stop()
+    print("STARTUP " + json.dumps(app.startup_marks))
+
+
+def slowest_imports(count):
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT,
+                            capture_output=True, text=True).stderr
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        # One space before app itself, two more per nesting level
+        if len(name) - len(name.lstrip()) == 3:
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", type=float, default=1.0, help="time-to-first-update budget in seconds")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        import asyncio
+        asyncio.run(_child())
+        return 0
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.split("STARTUP ", 1)[1]))
+    print(f"{'milestone':<16}{'median s':>10}{'max s':>8}")
+    for phase in runs[0]:
+        values = sorted(run[phase] for run in runs)
+        print(f"{phase:<16}{values[len(values) // 2]:>10.3f}{values[-1]:>8.3f}")
+    print("\nSlowest imports of app's direct dependencies (cumulative s):")
+    for seconds, name in slowest_imports(8):
+        print(f"  {seconds:7.3f}  {name}")
+
+    first_update = sorted(run['first_update'] for run in runs)[len(runs) // 2]
+    if first_update > args.target:
+        print(f"\nTime-to-first-update {first_update:.3f}s misses the {args.target}s target")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# Benchmark for the semantic topic cache (topic_index.py)
+#
+#   python benchmarks/bench_topic_index.py --entries 100000
+#
+# Builds an index of synthetic IELTS-style topics in a temporary directory and
+# reports lookup latency. Match quality is measured on the labelled pairs in
+# topic_pairs.py: a threshold sweep of rephrasing recall against near-miss
+# false hits, then the same pairs looked up through the full-size index.
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from topic_index import TopicIndex, vectorize
+from topic_pairs import PAIRS
+
+SUBJECTS = [
+    "governments", "parents", "schools", "universities", "employers", "young people",
+    "city councils", "international organisations", "online platforms", "local communities",
+    "teachers", "tourists", "scientists", "hospitals", "companies", "farmers",
+]
+ACTIONS = [
+    "spend more money on", "ban", "encourage", "invest in", "reduce funding for",
+    "take responsibility for", "promote", "regulate", "provide free", "limit access to",
+]
+OBJECTS = [
+    "space exploration", "public transport", "renewable energy", "arts education",
+    "online learning", "fast food advertising", "international tourism", "animal testing",
+    "museums and galleries", "team sports", "social media use", "healthcare for elderly people",
+    "foreign language learning", "recycling programmes", "working from home", "car ownership",
+    "genetic engineering", "zoos", "advertising aimed at children", "university tuition",
+]
+TASKS = [
+    "Discuss both views and give your opinion.",
+    "To what extent do you agree or disagree?",
+    "What are the advantages and disadvantages?",
+    "Is this a positive or negative development?",
+]
+OPENERS = ["Some people think that", "Many believe that", "It is often argued that", "Some say"]
+
+
+def make_topic(rng):
+    return (f"{rng.choice(OPENERS)} {rng.choice(SUBJECTS)} should {rng.choice(ACTIONS)} "
+            f"{rng.choice(OBJECTS)} in the {rng.randint(1, 10**6)} region. {rng.choice(TASKS)}")
+
+
+def pair_scores():
+    positives, negatives = [], []
+    for cached, incoming, same in PAIRS:
+        score = float(vectorize(cached) @ vectorize(incoming))
+        (positives if same else negatives).append(score)
+    return positives, negatives
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--threshold", type=float, default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as directory:
+        kwargs = {} if args.threshold is None else {'threshold': args.threshold}
+        index = TopicIndex(directory, **kwargs)
+        topics = []
+        start = time.perf_counter()
+        for _ in range(args.entries):
+            topic = make_topic(rng)
+            band = rng.randint(3, 9)
+            topics.append((topic, band))
+            index.add(topic, band, f"essay for {topic}")
+        build = time.perf_counter() - start
+        print(f"built {len(index)} entries in {build:.1f}s ({len(index) / build:.0f} adds/s)")
+
+        latencies = []
+        for topic, band in rng.sample(topics, args.queries):
+            start = time.perf_counter()
+            index.lookup(topic, band)
+            latencies.append(time.perf_counter() - start)
+        print(f"lookups: p50 {percentile(latencies, 50) * 1e3:.3f} ms, p99 {percentile(latencies, 99) * 1e3:.3f} ms")
+
+        positives, negatives = pair_scores()
+        print(f"\nlabelled pairs: {len(positives)} rephrasings, {len(negatives)} near misses")
+        print(f"{'threshold':>10}{'recall':>9}{'false hits':>12}")
+        # 0.78 is app.BREAKER_TOPIC_THRESHOLD, the looser match used while the backend is down
+        for threshold in (0.5, 0.6, 0.7, 0.75, 0.78, 0.8, 0.85, 0.9):
+            recall = sum(s >= threshold for s in positives) / len(positives)
+            false_hits = sum(s >= threshold for s in negatives) / len(negatives)
+            marker = "  <- configured" if abs(threshold - index.threshold) < 1e-9 else ""
+            print(f"{threshold:>10.2f}{recall:>9.1%}{false_hits:>12.1%}{marker}")
+
+        # The same pairs through the index, so the signature pre-filter is covered too
+        hits = {True: 0, False: 0}
+        for cached, incoming, same in PAIRS:
+            band = rng.randint(3, 9)
+            index.add(cached, band, cached)
+            hits[same] += index.lookup(incoming, band) == cached
+        print(f"index lookups at {index.threshold}: recall {hits[True] / len(positives):.1%}, "
+              f"false hits {hits[False] / len(negatives):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# Offline stand-ins for the two backends app.py talks to:
+#
+#   FakeBotRequest     in-process telegram.request.BaseRequest answering Bot API
+#                      methods (and file downloads) with synthetic results
+#   StubGeminiServer   local HTTP server speaking the generateContent REST API,
+#                      with lognormal latency and a configurable error rate
+#
+# Used by load_test.py; the stub server can also be run on its own:
+#
+#   python benchmarks/fakes.py --port 8089 --median 1.5 --error-rate 0.02
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from io import BytesIO
+from collections import Counter
+
+from PIL import Image
+from telegram.request import BaseRequest
+
+WORDS = (
+    "technology education government society people students children families cities "
+    "important significant development environment public private benefits problems "
+    "however furthermore therefore although because while moreover consequently "
+    "believe argue consider increase reduce improve provide require encourage support "
+    "many some most several various modern traditional local global economic social"
+).split()
+
+
+def lognormal(rng, median, sigma):
+    return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+
+def synthetic_essay(rng, words=260, paragraphs=4):
+    per_paragraph = words // paragraphs
+    out = []
+    for _ in range(paragraphs):
+        sentences = []
+        remaining = per_paragraph
+        while remaining > 0:
+            length = min(remaining, rng.randint(8, 22))
+            sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+            sentences.append(sentence[0].upper() + sentence[1:] + ".")
+            remaining -= length
+        out.append(" ".join(sentences))
+    return "\n\n".join(out)
+
+
+def sample_image(width=800, height=600, seed=0):
+    rng = random.Random(seed)
+    img = Image.new("L", (width, height), 255)
+    pixels = img.load()
+    for _ in range(width * height // 20):
+        pixels[rng.randrange(width), rng.randrange(height)] = rng.randrange(0, 120)
+    buffer = BytesIO()
+    img.convert("RGB").save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+class FakeBotRequest(BaseRequest):
+    def __init__(self, latency=0.03, sigma=0.3, seed=1):
+        self.latency = latency
+        self.sigma = sigma
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self.image = sample_image()
+        self._message_id = 1000
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, params, endpoint):
+        self._message_id += 1
+        chat_id = int(params.get('chat_id', 0) or 0)
+        extra = {}
+        if endpoint == "sendAnimation":
+            extra['animation'] = {'file_id': f"anim{self._message_id}", 'file_unique_id': f"a{self._message_id}",
+                                  'width': 320, 'height': 240, 'duration': 3}
+        return {**extra,
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': "private"},
+            'from': {'id': 1, 'is_bot': True, 'first_name': "bench"},
+            'text': params.get('text') or params.get('caption') or "",
+        }
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        await asyncio.sleep(lognormal(self.rng, self.latency, self.sigma))
+        if "/file/bot" in url:
+            self.calls['download'] += 1
+            return 200, self.image
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        params = request_data.parameters if request_data is not None else {}
+        if endpoint == "getMe":
+            result = {'id': 1, 'is_bot': True, 'first_name': "bench", 'username': "bench_bot",
+                      'can_join_groups': False, 'can_read_all_group_messages': False,
+                      'supports_inline_queries': False}
+        elif endpoint in ("sendMessage", "sendAnimation", "sendPhoto", "editMessageText", "editMessageCaption"):
+            result = self._message(params, endpoint)
+        elif endpoint == "getFile":
+            result = {'file_id': params.get('file_id'), 'file_unique_id': "u", 'file_size': len(self.image),
+                      'file_path': "photos/sample.jpg"}
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode("utf-8")
+
+
+def _tagged_paragraphs(prompt):
+    # Essay paragraphs start a line with their tag; the format line's "[P1], [P2], ..." doesn't count
+    return len(re.findall(r"^\[P\d+\] ", prompt, re.M)) or 1
+
+
+class StubGeminiServer:
+    # Answers POST /v1beta/models/<model>:generateContent and GET /v1beta/models/<model>
+    def __init__(self, median=1.5, sigma=0.5, error_rate=0.0, essay_factor=2.0, seed=2):
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.essay_factor = essay_factor    # essay generation and refinement take this much longer
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self.errors = 0
+        self._server = None
+        self._connections = {}    # writer -> handler task
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{self.port}"
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # Keep-alive connections stay open until the client closes them
+            for writer in self._connections:
+                writer.close()
+            await asyncio.gather(*self._connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+
+    def _reply(self, prompt):
+        if "ANALYZE THIS ESSAY" in prompt:
+            kind = "analysis"
+            paragraphs = _tagged_paragraphs(prompt)
+            text = ("Grammar Issues: Good\nAdvanced Vocabulary: Medium\nConnector Count: Medium\n"
+                    "Repeated Words: Low\nLexical Diversity: Medium\nAvg Sentence Length: Medium\n")
+            text += "\n".join(f"Paragraph {i}: Grammar Errors: 1, Advanced Words: 2" for i in range(1, paragraphs + 1))
+        elif "For each numbered paragraph" in prompt:
+            kind = "revision"
+            paragraphs = _tagged_paragraphs(prompt)
+            text = "\n".join(f"Paragraph {i}: Grammar Errors: 0, Advanced Words: 3" for i in range(1, paragraphs + 1))
+        elif "Write an IELTS Band" in prompt or "Improve this essay" in prompt:
+            kind = "essay"
+            text = synthetic_essay(self.rng)
+        elif "Extract" in prompt:
+            kind = "ocr"
+            text = synthetic_essay(self.rng, words=80, paragraphs=2)
+        else:
+            kind = "recommendations"
+            text = "Suggested Connectors: [Furthermore, However]\nAdvanced Vocabulary: [3] - [alleviate, foster, mitigate]"
+        return kind, text
+
+    async def _respond(self, method, path, body):
+        if method == "GET" and "/models/" in path:
+            self.calls['get_model'] += 1
+            return 200, {'name': "models/" + path.rsplit("/", 1)[-1]}
+        if method != "POST" or ":generateContent" not in path:
+            return 404, {'error': {'code': 404, 'message': "not found", 'status': "NOT_FOUND"}}
+        request = json.loads(body or b"{}")
+        prompt = "\n".join(part.get('text', "") for content in request.get('contents', [])
+                           for part in content.get('parts', []))
+        kind, text = self._reply(prompt)
+        self.calls[kind] += 1
+        factor = self.essay_factor if kind == "essay" else 1.0
+        await asyncio.sleep(lognormal(self.rng, self.median * factor, self.sigma))
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return 503, {'error': {'code': 503, 'message': "The model is overloaded.", 'status': "UNAVAILABLE"}}
+        prompt_tokens = len(prompt) // 4
+        output_tokens = len(text) // 4
+        return 200, {
+            'candidates': [{'content': {'parts': [{'text': text}], 'role': "model"}, 'finishReason': "STOP"}],
+            'usageMetadata': {'promptTokenCount': prompt_tokens, 'candidatesTokenCount': output_tokens,
+                              'totalTokenCount': prompt_tokens + output_tokens},
+            'modelVersion': path.split("/models/")[-1].split(":")[0],
+        }
+
+    async def _handle(self, reader, writer):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value.strip())
+                body = await reader.readexactly(length) if length else b""
+                method, path = request_line.decode("latin-1").split()[:2]
+                status, payload = await self._respond(method, path.split("?")[0], body)
+                data = json.dumps(payload).encode("utf-8")
+                reason = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}[status]
+                writer.write(
+                    f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+
+async def _serve_forever(args):
+    server = await StubGeminiServer(args.median, args.sigma, args.error_rate).start(port=args.port)
+    print(f"Stub Gemini listening on {server.base_url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--median", type=float, default=1.5, help="median latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.5, help="lognormal spread")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    try:
+        asyncio.run(_serve_forever(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,208 @@
+# End-to-end load test of the bot (app.py) without Telegram or Gemini
+#
+#   python benchmarks/load_test.py --users 50 --duration 60 --gemini-median 1.5
+#
+# Telegram is replaced by an in-process fake Bot API (fakes.FakeBotRequest) and
+# Gemini by a local HTTP stub (fakes.StubGeminiServer), so the real handlers,
+# send scheduler, gateway, caches and HTTP client all run. Virtual users loop
+# over the analyze / generate / handwriting flows; the report gives per-flow
+# throughput and latency percentiles plus gateway and scheduler highlights.
+#
+# --record FILE keeps the stub's answers as a gemini_fixtures corpus;
+# --replay FILE serves a corpus (e.g. recorded against the live API) instead
+# of the stub, with the recorded latency or --replay-timing zero.
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google import genai
+from telegram import Update
+
+import app
+import admission
+import brownout
+import gemini_fixtures
+from llm import http_options
+from topic_index import TopicIndex
+from fakes import FakeBotRequest, StubGeminiServer, synthetic_essay
+
+FLOWS = ("analyze", "generate", "handwriting")
+TOPICS = [
+    "Some people think governments should spend more money on public transport.",
+    "Many believe that online learning will replace traditional schools.",
+    "It is often argued that international tourism does more harm than good.",
+    "Some say zoos should be banned. To what extent do you agree or disagree?",
+    "Working from home is becoming more common. Is this a positive or negative development?",
+]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class VirtualUser:
+    def __init__(self, application, chat_id, rng):
+        self.application = application
+        self.chat_id = chat_id
+        self.rng = rng
+        self._update_id = chat_id * 1000
+        self._message_id = 0
+        self.essay = None
+        self.revision_share = 0.0
+
+    def _base(self):
+        self._update_id += 1
+        self._message_id += 1
+        return {
+            'update_id': self._update_id,
+            'chat': {'id': self.chat_id, 'type': "private"},
+            'from': {'id': self.chat_id, 'is_bot': False, 'first_name': f"user{self.chat_id}"},
+        }
+
+    def _message(self, **fields):
+        base = self._base()
+        message = {'message_id': self._message_id, 'date': int(time.time()),
+                   'chat': base['chat'], 'from': base['from'], **fields}
+        return {'update_id': base['update_id'], 'message': message}
+
+    def _callback(self, data):
+        base = self._base()
+        message = {'message_id': self._message_id, 'date': int(time.time()), 'chat': base['chat'],
+                   'from': {'id': 1, 'is_bot': True, 'first_name': "bench"}, 'text': "📝 IELTS Essay Assistant:"}
+        return {'update_id': base['update_id'],
+                'callback_query': {'id': str(base['update_id']), 'from': base['from'], 'chat_instance': "bench",
+                                   'data': data, 'message': message}}
+
+    async def send(self, payload):
+        update = Update.de_json(payload, self.application.bot)
+        processor = self.application.update_processor
+        await processor.process_update(update, self.application.process_update(update))
+
+    async def run_flow(self, flow):
+        await self.send(self._message(text="/start", entities=[{'type': "bot_command", 'offset': 0, 'length': 6}]))
+        await self.send(self._callback(flow))
+        if flow == "analyze":
+            if self.essay is not None and self.rng.random() < self.revision_share:
+                # A revision: one paragraph rewritten, so only it is re-scored
+                paragraphs = self.essay.split("\n\n")
+                paragraphs[self.rng.randrange(len(paragraphs))] = synthetic_essay(self.rng, words=70, paragraphs=1)
+                self.essay = "\n\n".join(paragraphs)
+            else:
+                self.essay = synthetic_essay(self.rng, words=self.rng.randint(180, 320))
+            await self.send(self._message(text=self.essay))
+        elif flow == "generate":
+            await self.send(self._message(text=str(self.rng.randint(5, 8))))
+            await self.send(self._message(text=self.rng.choice(TOPICS)))
+        else:
+            photo = [{'file_id': f"photo{self._update_id}", 'file_unique_id': f"u{self._update_id}",
+                      'width': 800, 'height': 600, 'file_size': 40000}]
+            await self.send(self._message(photo=photo))
+
+
+async def user_loop(user, flows, deadline, think_time, results):
+    while time.monotonic() < deadline:
+        flow = user.rng.choice(flows)
+        started = time.perf_counter()
+        try:
+            await user.run_flow(flow)
+            results[flow].append(time.perf_counter() - started)
+        except Exception as e:
+            results[flow + ":errors"].append(repr(e))
+        if think_time:
+            await asyncio.sleep(user.rng.expovariate(1 / think_time))
+
+
+def handler_errors():
+    return int(sum(child.value for child in app.metrics.handler_errors._children.values()))
+
+
+async def run(args):
+    stub = await StubGeminiServer(args.gemini_median, args.gemini_sigma, args.error_rate).start()
+    bot_request = FakeBotRequest(latency=args.telegram_latency)
+
+    client = genai.Client(api_key="bench", http_options=http_options(base_url=stub.base_url))
+    if args.replay:
+        client = gemini_fixtures.ReplayClient(args.replay, args.replay_timing)
+    elif args.record:
+        client = gemini_fixtures.RecordingClient(client, args.record)
+    app.gateway.client = client
+    app.topic_cache = TopicIndex(tempfile.mkdtemp(prefix="load_test_topics_"))
+    app.GIF_DISPLAY_SECONDS = args.gif_seconds
+    if args.brownout_level is not None:
+        brownout.BROWNOUT_FORCED_LEVEL = args.brownout_level
+        app.brownout.update()
+    if not args.chat_limits:
+        # Virtual users are far busier than students; only the global in-flight cap applies
+        admission.ADMISSION_BURST = admission.ADMISSION_MAX_INFLIGHT_PER_CHAT = 10 ** 6
+    application = app.build_application(token="1:bench", request=bot_request)
+    await application.initialize()   # post_init (metrics server, warm-up, essay pool) is not run
+
+    rng = random.Random(args.seed)
+    users = [VirtualUser(application, 100000 + i, random.Random(rng.random())) for i in range(args.users)]
+    for user in users:
+        user.revision_share = args.revision_share
+    results = defaultdict(list)
+    started = time.monotonic()
+    deadline = started + args.duration
+    await asyncio.gather(*(user_loop(user, args.flows, deadline, args.think_time, results) for user in users))
+    elapsed = time.monotonic() - started
+    await application.shutdown()
+    await stub.stop()
+
+    print(f"{args.users} users, {elapsed:.1f}s, Gemini median {args.gemini_median}s, error rate {args.error_rate}")
+    print(f"{'flow':<12}{'done':>7}{'errors':>8}{'per s':>8}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}")
+    for flow in args.flows:
+        latencies = results[flow]
+        print(f"{flow:<12}{len(latencies):>7}{len(results[flow + ':errors']):>8}{len(latencies) / elapsed:>8.2f}"
+              f"{percentile(latencies, 0.5):>8.2f}{percentile(latencies, 0.95):>8.2f}{percentile(latencies, 0.99):>8.2f}")
+        for error in results[flow + ':errors'][:3]:
+            print(f"  {error}")
+    print(f"handler errors: {handler_errors()}")
+
+    gateway = app.gateway.snapshot()
+    print(f"gateway: calls={gateway['calls']} fallbacks={gateway['fallbacks']} failed={gateway['failed']} "
+          f"breaker={gateway['breaker']['state']} hedged={gateway['hedging'].get('hedged')}")
+    print(f"admission: {app.update_processor.controller.snapshot()}")
+    print(f"brownout: {app.brownout.snapshot()}")
+    scheduler = app.send_scheduler.snapshot()
+    print(f"send scheduler: sent={scheduler['sent']} max_queued={scheduler['max_queued']} "
+          f"queue p50={scheduler['queue_delay_p50']}s p95={scheduler['queue_delay_p95']}s")
+    if args.replay:
+        print(f"replay: {client.snapshot()}")
+    else:
+        print(f"stub Gemini: {dict(stub.calls)} injected errors={stub.errors}")
+        if args.record:
+            print(f"recorded {client.recorded} calls to {args.record}")
+    print(f"fake Bot API: {dict(bot_request.calls)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=60, help="seconds of load")
+    parser.add_argument("--flows", nargs="+", choices=FLOWS, default=list(FLOWS))
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean pause between a user's flows")
+    parser.add_argument("--gemini-median", type=float, default=1.5, help="stub latency median in seconds")
+    parser.add_argument("--gemini-sigma", type=float, default=0.5, help="stub latency lognormal spread")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub calls answered with 503")
+    parser.add_argument("--telegram-latency", type=float, default=0.03, help="fake Bot API median latency")
+    parser.add_argument("--revision-share", type=float, default=0.5,
+                        help="share of analyze flows that resubmit the previous essay with one paragraph changed")
+    parser.add_argument("--gif-seconds", type=float, default=0.0, help="loading animation display time")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--brownout-level", type=int, choices=(0, 1, 2, 3), help="pin the brownout level")
+    parser.add_argument("--chat-limits", action="store_true", help="apply the per-chat admission limits")
+    parser.add_argument("--record", metavar="FILE", help="append Gemini calls to a fixture corpus")
+    parser.add_argument("--replay", metavar="FILE", help="answer Gemini calls from a fixture corpus")
+    parser.add_argument("--replay-timing", choices=("original", "zero"), default="original")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,103 @@
+# Labelled topic pairs for calibrating the topic cache (topic_index.py)
+#
+# (cached topic, incoming topic, whether the cached essay answers the incoming
+# topic). The positives are genuine rephrasings; the negatives share the theme
+# or the sentence frame but ask a different question.
+PAIRS = [
+    # Rephrasings of the same question
+    ("Some say zoos should be banned.", "Zoos should be banned. Agree or disagree?", True),
+    ("More and more people are working from home. Is this a positive or negative development?",
+     "Nowadays many employees work from home instead of going to the office. Is this a positive or negative trend?", True),
+    ("Governments should make public transport free. To what extent do you agree or disagree?",
+     "Public transportation should be provided free of charge by the government. Do you agree or disagree?", True),
+    ("Online learning is replacing traditional classroom teaching. What are the advantages and disadvantages?",
+     "Studying online is becoming more common than learning in a classroom. Discuss the advantages and disadvantages.", True),
+    ("University education should be free for everyone. Discuss both views and give your opinion.",
+     "Some believe university should be free of charge for all students, while others disagree. Discuss both views.", True),
+    ("Children today spend too much time on smartphones. What problems does this cause and what solutions can you suggest?",
+     "Kids nowadays spend too much time using smartphones. What problems does this cause? Suggest some solutions.", True),
+    ("Some people think that the best way to reduce crime is to give longer prison sentences. Others believe there are better ways to reduce crime.",
+     "Longer prison sentences are the best way to reduce crime. Others think there are better alternatives. Discuss both views.", True),
+    ("People are living longer than ever before. Is this a positive or negative development?",
+     "Life expectancy has increased and people now live longer. Is this a positive or a negative development?", True),
+    ("Social media has a negative impact on individuals and society. To what extent do you agree?",
+     "Many believe social networking sites have a negative impact on individuals and society. Do you agree or disagree?", True),
+    ("Should governments spend money on space exploration or solve problems on Earth?",
+     "Governments spend money exploring space instead of solving problems here on Earth. Discuss both views.", True),
+    ("Advertising aimed at children should be banned. Do you agree or disagree?",
+     "Should advertisements targeting children be banned? To what extent do you agree?", True),
+    ("Fast food is making people unhealthy. What are the causes and solutions?",
+     "Eating fast food makes people unhealthy. Discuss the causes and suggest solutions.", True),
+    ("Students should learn a foreign language at primary school. Do you agree or disagree?",
+     "Children should start learning a foreign language in primary school. To what extent do you agree?", True),
+    ("Many young people leave the countryside to live in cities. Why does this happen and what can be done?",
+     "Young people are leaving rural areas to live in big cities. Why is this happening and what can be done about it?", True),
+    ("International tourism has negative effects on local communities. Do you agree?",
+     "Some say international tourism harms local communities. To what extent do you agree or disagree?", True),
+    ("Animal testing for medical research should be banned. Discuss both views.",
+     "Testing on animals for medical research should be banned. Discuss both views and give your opinion.", True),
+    ("Car ownership should be limited to reduce traffic and pollution. Do you agree?",
+     "Governments should limit car ownership to reduce traffic and pollution. Agree or disagree?", True),
+    ("Team sports are more beneficial for children than individual sports. Do you agree?",
+     "Children benefit more from team sports than from individual sports. To what extent do you agree?", True),
+    ("Museums and art galleries should be free for everyone. Do you agree or disagree?",
+     "Entry to museums and art galleries should be free. To what extent do you agree?", True),
+    ("Recycling should be compulsory for all households. Do you agree?",
+     "Households should be required by law to recycle. To what extent do you agree or disagree?", True),
+    ("Genetic engineering of food crops is dangerous. Discuss both views.",
+     "Some people think genetically engineered food crops are dangerous, others disagree. Discuss both views and give your opinion.", True),
+    ("Working from home is better than working in an office. Do you agree?",
+     "It is better to work from home than to work in an office. To what extent do you agree or disagree?", True),
+    ("Parents should be responsible for teaching children good behaviour. Do you agree?",
+     "Teaching children good behaviour is the responsibility of parents. Do you agree or disagree?", True),
+    ("Renewable energy should replace fossil fuels. Discuss the advantages and disadvantages.",
+     "Fossil fuels should be replaced by renewable energy. What are the advantages and disadvantages?", True),
+    # Same theme, different question: reusing the essay would be wrong
+    ("Some say zoos should be banned.", "Zoos should receive more government funding. Do you agree?", False),
+    ("Governments should make public transport free. To what extent do you agree or disagree?",
+     "Governments should spend more on roads than on public transport. Do you agree?", False),
+    ("Online learning is replacing traditional classroom teaching. What are the advantages and disadvantages?",
+     "Teachers should be paid more than doctors. Do you agree?", False),
+    ("University education should be free for everyone. Discuss both views and give your opinion.",
+     "University students should study science rather than arts subjects. Discuss both views and give your opinion.", False),
+    ("Children today spend too much time on smartphones. What problems does this cause and what solutions can you suggest?",
+     "Children should be given smartphones at school for learning. Do you agree or disagree?", False),
+    ("People are living longer than ever before. Is this a positive or negative development?",
+     "More people are choosing to live alone. Is this a positive or negative development?", False),
+    ("Social media has a negative impact on individuals and society. To what extent do you agree?",
+     "Television has a negative impact on individuals and society. To what extent do you agree?", False),
+    ("Advertising aimed at children should be banned. Do you agree or disagree?",
+     "Advertising of alcohol should be banned. Do you agree or disagree?", False),
+    ("Fast food is making people unhealthy. What are the causes and solutions?",
+     "Traffic congestion is getting worse in cities. What are the causes and solutions?", False),
+    ("Students should learn a foreign language at primary school. Do you agree or disagree?",
+     "Students should learn music at primary school. Do you agree or disagree?", False),
+    ("International tourism has negative effects on local communities. Do you agree?",
+     "International tourism brings economic benefits to poor countries. Do you agree?", False),
+    ("Animal testing for medical research should be banned. Discuss both views.",
+     "Hunting animals for sport should be banned. Discuss both views.", False),
+    ("Car ownership should be limited to reduce traffic and pollution. Do you agree?",
+     "Air travel should be limited to reduce pollution. Do you agree?", False),
+    ("Team sports are more beneficial for children than individual sports. Do you agree?",
+     "Professional sports stars are paid too much. Do you agree?", False),
+    ("Museums and art galleries should be free for everyone. Do you agree or disagree?",
+     "Public libraries should be free for everyone. Do you agree or disagree?", False),
+    ("Recycling should be compulsory for all households. Do you agree?",
+     "Voting should be compulsory for all citizens. Do you agree?", False),
+    ("Working from home is better than working in an office. Do you agree?",
+     "Working part-time is better than working full-time. Do you agree?", False),
+    ("Parents should be responsible for teaching children good behaviour. Do you agree?",
+     "Schools should be responsible for teaching children about money. Do you agree?", False),
+    ("Renewable energy should replace fossil fuels. Discuss the advantages and disadvantages.",
+     "Nuclear power should replace fossil fuels. Discuss the advantages and disadvantages.", False),
+    ("Many young people leave the countryside to live in cities. Why does this happen and what can be done?",
+     "Many old people are lonely in cities. Why does this happen and what can be done?", False),
+    ("Should governments spend money on space exploration or solve problems on Earth?",
+     "Should governments spend money on the arts or on healthcare?", False),
+    ("Some people think that the best way to reduce crime is to give longer prison sentences. Others believe there are better ways to reduce crime.",
+     "Some people think that the best way to reduce obesity is to tax sugary drinks. Others believe there are better ways.", False),
+    ("Genetic engineering of food crops is dangerous. Discuss both views.",
+     "Organic food is healthier than ordinary food. Discuss both views.", False),
+    ("Working from home is better than working in an office. Do you agree?",
+     "Open-plan offices are better than private offices. Do you agree?", False),
+]
@@ -0,0 +1,100 @@
+import time
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+# Brownout: under load, optional work is shed in steps so the core answer
+# stays fast. Each signal reports pressure as a ratio (1.0 = at its limit);
+# the worst one picks the level. Levels rise at once and fall one step at a
+# time after pressure has stayed low for BROWNOUT_HOLD_SECONDS.
+#
+#   level 1: no loading/meme animations, no prefetch, best-of-N or pool refills
+#   level 2: analysis results as text, without the chart
+#   level 3: cached or local-only analysis, no LLM follow-ups
+BROWNOUT_ENTER = (0.6, 0.8, 1.0)    # pressure that enters levels 1, 2, 3
+BROWNOUT_EXIT_RATIO = 0.7           # a level is left below this share of its entry pressure
+BROWNOUT_HOLD_SECONDS = 30
+BROWNOUT_INTERVAL = 1.0             # seconds between evaluations
+BROWNOUT_FORCED_LEVEL = None        # set to pin a level, e.g. during an incident
+
+# Feature -> level from which it is switched off
+FEATURE_LEVELS = {
+    'animations': 1,
+    'speculative': 1,
+    'chart': 2,
+    'llm_followups': 3,
+    'llm_analysis': 3,
+}
+
+
+class BrownoutController:
+    def __init__(self, signals=None):
+        self.signals = dict(signals or {})  # name -> () -> pressure ratio
+        self.level = 0
+        self.pressure = 0.0
+        self.readings = {}
+        self._low_since = None
+        self.transitions = {}
+        self.shed = {feature: 0 for feature in FEATURE_LEVELS}
+
+    def add_signal(self, name, read):
+        self.signals[name] = read
+
+    def allows(self, feature):
+        if self.level >= FEATURE_LEVELS[feature]:
+            self.shed[feature] += 1
+            return False
+        return True
+
+    def _read(self):
+        readings = {}
+        for name, read in self.signals.items():
+            try:
+                readings[name] = round(float(read()), 3)
+            except Exception as e:
+                log.warning("Brownout signal %s failed: %s", name, e)
+        return readings
+
+    def _set_level(self, level):
+        key = f"{self.level}->{level}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        log.warning("Brownout level %d -> %d (pressure %.2f, %s)", self.level, level, self.pressure, self.readings)
+        self.level = level
+
+    def update(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.readings = self._read()
+        self.pressure = max(self.readings.values(), default=0.0)
+        if BROWNOUT_FORCED_LEVEL is not None:
+            target = BROWNOUT_FORCED_LEVEL
+        else:
+            target = sum(self.pressure >= threshold for threshold in BROWNOUT_ENTER)
+        if target > self.level or BROWNOUT_FORCED_LEVEL is not None:
+            self._low_since = None
+            if target != self.level:
+                self._set_level(target)
+            return self.level
+        if self.level and self.pressure < BROWNOUT_ENTER[self.level - 1] * BROWNOUT_EXIT_RATIO:
+            if self._low_since is None:
+                self._low_since = now
+            elif now - self._low_since >= BROWNOUT_HOLD_SECONDS:
+                self._low_since = now   # the next step down needs its own quiet spell
+                self._set_level(self.level - 1)
+        else:
+            self._low_since = None
+        return self.level
+
+    async def run(self, interval=BROWNOUT_INTERVAL):
+        while True:
+            self.update()
+            await asyncio.sleep(interval)
+
+    def snapshot(self):
+        return {
+            'level': self.level,
+            'pressure': round(self.pressure, 3),
+            'signals': dict(self.readings),
+            'transitions': dict(self.transitions),
+            'shed': dict(self.shed),
+        }
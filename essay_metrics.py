@@ -0,0 +1,180 @@
+import re
+import hashlib
+from collections import Counter
+
+import rubric
+
+# Local, deterministic essay metrics, computed per paragraph so revisions can be
+# re-scored incrementally
+
+CONNECTORS = [
+    "however", "furthermore", "moreover", "therefore", "consequently", "additionally",
+    "nevertheless", "nonetheless", "although", "though", "because", "since", "whereas",
+    "while", "thus", "hence", "besides", "meanwhile", "otherwise", "instead", "similarly",
+    "likewise", "firstly", "secondly", "thirdly", "finally", "lastly", "overall", "and",
+    "but", "so", "yet", "or", "also", "despite", "unless",
+    "in addition", "in conclusion", "for example", "for instance", "on the other hand",
+    "as a result", "in contrast", "in fact", "to conclude", "to sum up", "as well as",
+    "due to", "not only", "in other words",
+]
+
+FUNCTION_WORDS = frozenset("""
+a an the this that these those some any each every no all both either neither
+i me my mine we us our you your he him his she her it its they them their what which
+who whom whose
+and or but so yet nor because although though if unless while whereas since as than
+whether also
+of in on at by for with about against between into through during before after above
+below to from up down out off over under again further then once here there when where
+why how
+is am are was were be been being have has had having do does did doing will would shall
+should can could may might must
+not very too just only own same such more most other
+""".split())
+
+# Word count range per band, following the length guidance in BAND_INSTRUCTIONS
+LENGTH_TARGETS = {9: (300, 380), 8: (280, 360), 7: (250, 320), 6: (230, 290), 5: (180, 230), 4: (130, 180), 3: (60, 100)}
+
+REPEAT_MIN_OCCURRENCES = 4      # a content word seen this often counts as repeated
+REPEAT_MIN_LENGTH = 4           # ignore short words when looking for repeats
+
+_CONNECTOR_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted((re.escape(c) for c in CONNECTORS), key=len, reverse=True)) + r")\b"
+)
+
+
+def split_paragraphs(essay):
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", essay.strip()) if p.strip()]
+    if len(paragraphs) == 1:
+        # Pasted essays often separate paragraphs with single line breaks
+        paragraphs = [p.strip() for p in essay.strip().splitlines() if p.strip()]
+    return paragraphs
+
+
+def paragraph_hash(paragraph):
+    normalized = " ".join(paragraph.split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def paragraph_metrics(paragraph):
+    words = re.findall(r"[A-Za-z]+(?:'[A-Za-z]+)?", paragraph)
+    lowered = [w.lower() for w in words]
+    sentences = [s for s in re.split(r"[.!?]+", paragraph) if re.search(r"[A-Za-z]", s)]
+    content = [w for w in lowered if w not in FUNCTION_WORDS]
+    return {
+        'words': len(words),
+        'sentences': len(sentences),
+        'connectors': len(_CONNECTOR_PATTERN.findall(paragraph.lower())),
+        'content_words': len(content),
+        'word_counts': Counter(w for w in content if len(w) >= REPEAT_MIN_LENGTH),
+    }
+
+
+def combine_metrics(metrics_list):
+    totals = {'words': 0, 'sentences': 0, 'connectors': 0, 'content_words': 0, 'word_counts': Counter()}
+    for metrics in metrics_list:
+        for key in ('words', 'sentences', 'connectors', 'content_words'):
+            totals[key] += metrics[key]
+        totals['word_counts'].update(metrics['word_counts'])
+    totals['repeated_words'] = sum(
+        1 for count in totals['word_counts'].values() if count >= REPEAT_MIN_OCCURRENCES
+    )
+    totals['lexical_density'] = totals['content_words'] / totals['words'] if totals['words'] else 0.0
+    totals['avg_sentence_length'] = totals['words'] / totals['sentences'] if totals['sentences'] else 0.0
+    return totals
+
+
+# Paragraph-level analysis record kept in the session between submissions
+def build_record(essay, counts):
+    # counts: one (grammar_errors, advanced_words) pair per paragraph
+    paragraphs = split_paragraphs(essay)
+    if counts is None or len(counts) != len(paragraphs):
+        return None
+    return [
+        {
+            'hash': paragraph_hash(paragraph),
+            'metrics': paragraph_metrics(paragraph),
+            'grammar_errors': grammar_errors,
+            'advanced_words': advanced_words,
+        }
+        for paragraph, (grammar_errors, advanced_words) in zip(paragraphs, counts)
+    ]
+
+
+def diff_paragraphs(essay, record):
+    # Returns (paragraphs, reused entries or None per paragraph)
+    known = {entry['hash']: entry for entry in record or []}
+    paragraphs = split_paragraphs(essay)
+    return paragraphs, [known.get(paragraph_hash(p)) for p in paragraphs]
+
+
+def record_measurements(record):
+    # Locally known value behind each category, from the paragraph record
+    totals = combine_metrics([entry['metrics'] for entry in record])
+    return {
+        "Grammar Issues": sum(entry['grammar_errors'] for entry in record),
+        "Advanced Vocabulary": sum(entry['advanced_words'] for entry in record),
+        "Connector Count": totals['connectors'],
+        "Repeated Words": totals['repeated_words'],
+        "Lexical Diversity": totals['lexical_density'],
+        "Avg Sentence Length": totals['avg_sentence_length'],
+    }
+
+
+def revise_analysis(previous, old_record, new_record):
+    # The previous analysis stands; a label moves only as many rubric steps as
+    # the edits move its measurement, so the model's judgement is kept
+    before, after = record_measurements(old_record), record_measurements(new_record)
+    analysis = dict(previous)
+    for category in before:
+        names = rubric.label_names(category)
+        old = names.index(rubric.classify(category, before[category]))
+        new = names.index(rubric.classify(category, after[category]))
+        label = previous.get(category)
+        if label not in names:
+            analysis[category] = names[new]
+        elif new != old:
+            analysis[category] = names[max(0, min(len(names) - 1, names.index(label) + new - old))]
+    return rubric.apply_band(analysis)
+
+
+def local_analysis(essay, grammar_errors, advanced_words):
+    # Analysis from local measurements only, for when the model is unavailable
+    totals = combine_metrics([paragraph_metrics(p) for p in split_paragraphs(essay)])
+    return analysis_from_totals(totals, grammar_errors, advanced_words)
+
+
+def analysis_from_totals(totals, grammar_errors, advanced_words):
+    analysis = {
+        "Grammar Issues": rubric.classify("Grammar Issues", grammar_errors),
+        "Advanced Vocabulary": rubric.classify("Advanced Vocabulary", advanced_words),
+        "Connector Count": rubric.classify("Connector Count", totals['connectors']),
+        "Repeated Words": rubric.classify("Repeated Words", totals['repeated_words']),
+        "Lexical Diversity": rubric.classify("Lexical Diversity", totals['lexical_density']),
+        "Avg Sentence Length": rubric.classify("Avg Sentence Length", totals['avg_sentence_length']),
+    }
+    return rubric.apply_band(analysis)
+
+
+# Categories that can be measured without the model, for scoring generated candidates
+LOCAL_CATEGORIES = {
+    "Connector Count": 'connectors',
+    "Repeated Words": 'repeated_words',
+    "Avg Sentence Length": 'avg_sentence_length',
+}
+
+
+def band_distance(essay, band):
+    # How far an essay's locally measured metrics are from the band's targets, in rubric points
+    totals = combine_metrics([paragraph_metrics(p) for p in split_paragraphs(essay)])
+    target = rubric.target_profile(band)
+    distance = 0
+    for category, key in LOCAL_CATEGORIES.items():
+        measured = rubric.classify(category, totals[key])
+        distance += abs(rubric.points_for(category, measured) - rubric.points_for(category, target[category]))
+    low, high = LENGTH_TARGETS[max(3, min(9, int(band)))]
+    if totals['words'] < low:
+        distance += (low - totals['words']) / low * 5
+    elif totals['words'] > high:
+        distance += (totals['words'] - high) / high * 5
+    return distance
@@ -0,0 +1,181 @@
+import re
+import time
+import asyncio
+import logging
+import hashlib
+from collections import OrderedDict, deque
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+# Pool settings
+POOL_VARIANTS_PER_KEY = 3       # essays kept per (topic, band)
+POOL_MAX_KEYS = 500             # least recently used keys are evicted past this
+POOL_VARIANT_TTL = 7 * 24 * 3600  # variants older than this get replaced during refills
+POOL_OFF_PEAK_HOURS = {1, 2, 3, 4, 5}  # local hours when the worker may generate
+POOL_REFILL_INTERVAL = 300      # seconds between worker passes
+POOL_REFILL_BATCH = 10          # essays generated per worker pass
+POOL_MIN_DEMAND = 2             # requests before a topic is worth pre-generating
+POOL_MAX_DEMAND_KEYS = 10_000   # requested keys whose demand is tracked; least recent dropped first
+
+# Well-known IELTS Task 2 prompts that are worth keeping warm from day one
+POPULAR_TOPICS = [
+    "Many think that governments should fund programs in search of life on other planets. However, others believe governments should focus on unresolved issues on the planet. Provide your opinion and discuss both views.",
+    "Some people believe that university students should pay all the cost of their studies. Others think that university education should be free. Discuss both views and give your opinion.",
+    "Some people think that the best way to reduce crime is to give longer prison sentences. Others believe there are better ways to reduce crime. Discuss both views and give your opinion.",
+    "In many countries, people are now living longer than ever before. Is this a positive or negative development?",
+    "Some people think that children should begin their formal education at a very early age. Others think they should not start school until they are older. Discuss both views and give your opinion.",
+    "Many people believe that social networking sites have had a huge negative impact on both individuals and society. To what extent do you agree or disagree?",
+]
+POPULAR_BANDS = [6, 7, 8]
+
+
+def normalize_topic(topic):
+    topic = re.sub(r"[^\w\s]", " ", topic.lower())
+    return " ".join(topic.split())
+
+
+def essay_fingerprint(essay):
+    return hashlib.sha1(essay.encode("utf-8")).hexdigest()[:16]
+
+
+class EssayPool:
+    def __init__(self, generate, variants_per_key=POOL_VARIANTS_PER_KEY, max_keys=POOL_MAX_KEYS):
+        # generate: async (topic, band) -> essay text, or None on failure
+        self.generate = generate
+        self.variants_per_key = variants_per_key
+        self.max_keys = max_keys
+        self.entries = OrderedDict()   # (topic, band) -> {'topic': str, 'variants': deque of (created, essay)}
+        self.demand = OrderedDict()    # key -> request count, least recently requested first
+        self.pinned = set()            # seeded keys, kept warm whatever their demand
+        self.underfilled_since = {}    # key -> time the key was first seen below capacity
+        self.refill_lags = deque(maxlen=200)
+        self.stats = {'hits': 0, 'misses': 0, 'generated': 0, 'failed': 0, 'evicted': 0}
+
+    def _key(self, topic, band):
+        return (normalize_topic(topic), int(band))
+
+    def take(self, topic, band, seen=None):
+        # Serve the next variant in rotation, skipping ones this chat has already seen;
+        # None when there is nothing new for it, so the caller generates a fresh essay
+        key = self._key(topic, band)
+        self._count_demand(key)
+        entry = self.entries.get(key)
+        if entry is None or not entry['variants']:
+            self.stats['misses'] += 1
+            self._mark_underfilled(key)
+            return None
+        self.entries.move_to_end(key)
+        variants = entry['variants']
+        for _ in range(len(variants)):
+            created, essay = variants[0]
+            variants.rotate(-1)
+            if seen is None or essay_fingerprint(essay) not in seen:
+                break
+        else:
+            # Every variant was seen already; ask for fresh ones
+            self.stats['misses'] += 1
+            self._mark_underfilled(key, force=True)
+            return None
+        if seen is not None:
+            seen.add(essay_fingerprint(essay))
+        self.stats['hits'] += 1
+        return essay
+
+    def add(self, topic, band, essay):
+        key = self._key(topic, band)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = {'topic': topic, 'variants': deque()}
+            while len(self.entries) > self.max_keys:
+                evicted, _ = self.entries.popitem(last=False)
+                self.underfilled_since.pop(evicted, None)
+                self.stats['evicted'] += 1
+        self.entries.move_to_end(key)
+        entry['variants'].append((time.time(), essay))
+        while len(entry['variants']) > self.variants_per_key:
+            entry['variants'].popleft()
+        if len(entry['variants']) >= self.variants_per_key and key in self.underfilled_since:
+            self.refill_lags.append(time.time() - self.underfilled_since.pop(key))
+
+    def _count_demand(self, key):
+        self.demand[key] = self.demand.get(key, 0) + 1
+        self.demand.move_to_end(key)
+        while len(self.demand) > POOL_MAX_DEMAND_KEYS:
+            # One-off topics age out here, with any refill they were waiting for
+            dropped, _ = self.demand.popitem(last=False)
+            if dropped not in self.pinned:
+                self.underfilled_since.pop(dropped, None)
+
+    def _wanted(self, key):
+        return key in self.pinned or self.demand.get(key, 0) >= POOL_MIN_DEMAND
+
+    def _mark_underfilled(self, key, force=False):
+        if not self._wanted(key):
+            return
+        entry = self.entries.get(key)
+        if force or entry is None or len(entry['variants']) < self.variants_per_key:
+            self.underfilled_since.setdefault(key, time.time())
+
+    def _refill_candidates(self):
+        now = time.time()
+        candidates = []
+        wanted = [key for key in self.demand if self._wanted(key)]
+        wanted += [key for key in self.pinned if key not in self.demand]
+        wanted.sort(key=lambda key: self.demand.get(key, 0), reverse=True)
+        for key in wanted:
+            entry = self.entries.get(key)
+            variants = entry['variants'] if entry else ()
+            stale = any(now - created > POOL_VARIANT_TTL for created, _ in variants)
+            if len(variants) < self.variants_per_key or stale or key in self.underfilled_since:
+                candidates.append(key)
+        return candidates
+
+    def seed(self, topics=POPULAR_TOPICS, bands=POPULAR_BANDS):
+        for topic in topics:
+            for band in bands:
+                key = self._key(topic, band)
+                self.pinned.add(key)
+                self.entries.setdefault(key, {'topic': topic, 'variants': deque()})
+                self._mark_underfilled(key)
+
+    async def refill_once(self, limit=POOL_REFILL_BATCH):
+        generated = 0
+        for key in self._refill_candidates():
+            if generated >= limit:
+                break
+            entry = self.entries.get(key)
+            topic = entry['topic'] if entry else key[0]
+            essay = await self.generate(topic, key[1])
+            if essay is None:
+                self.stats['failed'] += 1
+                continue
+            # When the key is already full, the new essay replaces the oldest one
+            self.add(topic, key[1], essay)
+            self.stats['generated'] += 1
+            generated += 1
+        return generated
+
+    async def run_worker(self, interval=POOL_REFILL_INTERVAL, off_peak_hours=POOL_OFF_PEAK_HOURS, paused=None):
+        # paused: optional () -> bool; refills are skipped while it is true
+        while True:
+            if datetime.now().hour in off_peak_hours and not (paused is not None and paused()):
+                try:
+                    await self.refill_once()
+                except Exception as e:
+                    log.warning("Essay pool refill error: %s", e)
+            await asyncio.sleep(interval)
+
+    def snapshot(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        lags = list(self.refill_lags)
+        now = time.time()
+        return {
+            **self.stats,
+            'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+            'keys': len(self.entries),
+            'variants': sum(len(e['variants']) for e in self.entries.values()),
+            'underfilled': len(self.underfilled_since),
+            'avg_refill_lag': sum(lags) / len(lags) if lags else 0.0,
+            'oldest_pending_refill': max((now - t for t in self.underfilled_since.values()), default=0.0),
+        }
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import defaultdict
+
+from google.genai import errors, types
+
+# Record/replay of Gemini calls. In record mode every generate_content call of
+# the real client is appended to a JSONL corpus (prompt hash, model, latency,
+# tokens, response or error); in replay mode the corpus answers instead of the
+# API, with the recorded latency or none, so prompt and performance
+# experiments run deterministically and offline. Both wrap the object handed
+# to LLMGateway, which only uses client.aio.models.generate_content / get.
+GEMINI_FIXTURE_MODE = None          # None, "record" or "replay"
+GEMINI_FIXTURE_FILE = "fixtures/gemini.jsonl"
+GEMINI_REPLAY_TIMING = "original"   # "original": sleep the recorded latency; "zero": answer at once
+
+
+class ReplayMiss(LookupError):
+    # No recorded call for this prompt
+    def __init__(self, model, prompt_hash):
+        super().__init__(f"No recorded Gemini response for {model} prompt {prompt_hash}")
+        self.model = model
+        self.prompt_hash = prompt_hash
+
+
+def _part_key(part):
+    if isinstance(part, str):
+        return part
+    if isinstance(part, types.Part):
+        if part.inline_data is not None:
+            blob = part.inline_data
+            return f"{blob.mime_type}:{hashlib.sha256(blob.data or b'').hexdigest()}"
+        if part.text is not None:
+            return part.text
+    if isinstance(part, types.Content):
+        return "\n".join(_part_key(p) for p in part.parts or [])
+    return repr(part)
+
+
+def prompt_hash(contents):
+    # Stable across runs: text as is, images by content hash
+    if not isinstance(contents, (list, tuple)):
+        contents = [contents]
+    digest = hashlib.sha256("\x1e".join(_part_key(part) for part in contents).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _tokens(response):
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None
+    return {
+        'prompt': usage.prompt_token_count,
+        'output': usage.candidates_token_count,
+        'total': usage.total_token_count,
+    }
+
+
+class _Aio:
+    def __init__(self, models):
+        self.models = models
+
+
+class RecordingClient:
+    # Passes calls through to a genai.Client and appends each one to path
+    def __init__(self, client, path=None):
+        self.client = client
+        self.path = GEMINI_FIXTURE_FILE if path is None else path
+        self.recorded = 0
+        self.aio = _Aio(self)
+
+    def _append(self, record):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        self.recorded += 1
+
+    async def generate_content(self, model, contents, **kwargs):
+        record = {'prompt_hash': prompt_hash(contents), 'model': model, 'recorded_at': time.time()}
+        started = time.monotonic()
+        try:
+            response = await self.client.aio.models.generate_content(model=model, contents=contents, **kwargs)
+        except errors.APIError as e:
+            record.update(latency=round(time.monotonic() - started, 4),
+                          error={'code': e.code, 'response': e.details})
+            self._append(record)
+            raise
+        record.update(latency=round(time.monotonic() - started, 4), tokens=_tokens(response),
+                      response=response.model_dump(mode="json", exclude_none=True, exclude={'sdk_http_response'}))
+        self._append(record)
+        return response
+
+    async def get(self, model, **kwargs):
+        return await self.client.aio.models.get(model=model, **kwargs)
+
+
+class ReplayClient:
+    # Serves generate_content from a recorded corpus; no network
+    def __init__(self, path=None, timing=None):
+        # Settings left as None are read from the module globals at call time
+        path = GEMINI_FIXTURE_FILE if path is None else path
+        timing = GEMINI_REPLAY_TIMING if timing is None else timing
+        if timing not in ("original", "zero"):
+            raise ValueError(f"Unknown replay timing: {timing}")
+        self.timing = timing
+        self.aio = _Aio(self)
+        self._by_model = defaultdict(list)     # (prompt hash, model) -> records
+        self._by_prompt = defaultdict(list)    # prompt hash -> records, when routing picked another model
+        self._next = defaultdict(int)
+        self.stats = {'hits': 0, 'model_substituted': 0, 'misses': 0}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self._by_model[(record['prompt_hash'], record['model'])].append(record)
+                    self._by_prompt[record['prompt_hash']].append(record)
+
+    def _lookup(self, key, records):
+        # Repeated prompts cycle through their recordings in order
+        index = self._next[key]
+        self._next[key] = index + 1
+        return records[index % len(records)]
+
+    async def generate_content(self, model, contents, **kwargs):
+        digest = prompt_hash(contents)
+        records = self._by_model.get((digest, model))
+        if records:
+            record = self._lookup((digest, model), records)
+        elif self._by_prompt.get(digest):
+            self.stats['model_substituted'] += 1
+            record = self._lookup(digest, self._by_prompt[digest])
+        else:
+            self.stats['misses'] += 1
+            raise ReplayMiss(model, digest)
+        self.stats['hits'] += 1
+        if self.timing == "original":
+            await asyncio.sleep(record['latency'])
+        if 'error' in record:
+            raise errors.APIError(record['error']['code'], record['error']['response'])
+        return types.GenerateContentResponse.model_validate(record['response'])
+
+    async def get(self, model, **kwargs):
+        return types.Model(name=f"models/{model}")
+
+    def snapshot(self):
+        return {**self.stats, 'prompts': len(self._by_prompt)}
+
+
+def wrap(client, mode=None, path=None, timing=None):
+    # The client LLMGateway should use for the configured mode. Settings left as
+    # None come from the module globals when called, so they can be set at runtime
+    mode = GEMINI_FIXTURE_MODE if mode is None else mode
+    if mode is None:
+        return client
+    if mode == "record":
+        return RecordingClient(client, path)
+    if mode == "replay":
+        return ReplayClient(path, timing)
+    raise ValueError(f"Unknown Gemini fixture mode: {mode}")
@@ -0,0 +1,141 @@
+import os
+import re
+from functools import lru_cache
+
+# Word-level vocabulary lexicon for local Advanced Vocabulary classification.
+# Lemmas are grouped by proficiency level and frozen into hash sets at import;
+# anything not listed counts as basic vocabulary.
+LEXICON_EXTRA_PATH = "data/lexicon.txt"   # optional "lemma level" lines, level in {intermediate, advanced}
+
+_INTERMEDIATE = """
+ability access achieve acquire adapt adequate affect alternative analyse analyze approach
+appropriate aspect assess assist assume attitude authority available aware benefit budget
+capable category challenge characteristic claim colleague commit communicate community
+complex concentrate concept conclude conduct confidence conflict consequence consider
+consist constant construct consume contact contemporary context contribute convenient
+convince create crisis critical culture debate decade decline define demand demonstrate
+depend design despite detect determine develop development device distinct distribute
+diverse economy effective efficient element emerge emphasis encourage energy enormous
+ensure environment equipment essential establish estimate evaluate evidence evident
+exceed expand expert explore expose facility factor feature finance focus former
+function fund generate generation global goal identify ignore illustrate impact implement
+imply improve income increase indicate individual influence initial injury instance
+institution invest involve issue journal labour labor layer lecture legal likewise
+locate maintain major majority manufacture measure media mental method minor moreover
+motivate negative network nevertheless obtain obvious occur option outcome participate
+particular percent period permanent perspective phenomenon policy pollution positive
+potential predict previous primary principle priority process professional promote
+proportion proposal provide publish purchase pursue range rate react recover reduce
+region regulate reject relevant rely remove require research resource respond restrict
+reveal revenue role section sector secure seek select significant similar site
+solution source specific stable strategy stress structure sufficient survey sustain
+target technique technology temporary tend theory therefore thus tradition transfer
+transport trend ultimate unique urban vary vehicle version volunteer welfare whereas
+widespread
+"""
+
+_ADVANCED = """
+abolish abundant accelerate accountability acknowledge advocate aesthetic affluent
+aggravate alienation allocate alleviate ambiguous ameliorate amplify analogous
+anticipate arbitrary articulate ascertain aspiration assimilate attribute augment
+autonomy autonomous bureaucracy burgeoning catalyst circumvent coherent cohesion
+collaborate commodity compelling compensate competent complacent comprehensive
+compromise concede conducive confront conscientious consensus consolidate conspicuous
+constituent contemplate contentious contradict controversial conventional correlate
+credible criterion cultivate cumulative curtail debilitate deduce deficiency
+deforestation degradation deliberate demographic denote deplete deprivation derive
+deteriorate deter detrimental devastate diminish discern discrepancy discrimination
+disparity disproportionate disseminate distort diversify dominant drastic dubious
+eclectic elaborate elicit eliminate eloquent embody empirical empower emulate endeavour
+endeavor endorse enhance enhancement entail entrepreneurial equitable eradicate erode
+escalate exacerbate exemplify exorbitant explicit exploit extrapolate facilitate
+feasible fluctuate formidable foster fragmented fundamentally globalization globalisation
+hamper hierarchy holistic homogeneous hypothesis hypothetical ideology impede imperative
+implication implicit impoverished inadequate incentive incidence incorporate
+indispensable induce inequality inevitable inexorable infrastructure inherent inhibit
+initiative innovation innovative insight integral integrate integrity intervene
+intervention intrinsic invaluable jeopardize jeopardise juxtapose legislation legitimate
+leverage lucrative magnitude mandatory manifest marginal marginalize marginalise
+meticulous migration mitigate modify momentum monopoly mundane necessitate negligible
+notion notwithstanding nuance obsolete offset ostensibly overwhelming paradigm paradox
+paramount perceive perception perpetuate pertinent pervasive phenomenal pivotal
+plausible polarize polarise pragmatic precede precedent predominantly preliminary
+premise prerequisite presumably prevalent proficiency profound prohibit proliferate
+prominent propensity prosperity proponent provision proximity rationale reconcile
+redundant refute reinforce reluctant remuneration repercussion resilience resilient
+retain retention rhetoric rigorous scrutiny sedentary segregation sophisticated
+socioeconomic stagnation stakeholder stimulate stringent subordinate subsequent
+subsidize subsidise subsidy substantial substantiate subtle succinct supersede
+superfluous susceptible sustainability sustainable synthesis tangible tenuous
+therapeutic transformation transition transparent unprecedented unequivocal
+urbanization urbanisation utilitarian utilize utilise validate viable vulnerable
+vulnerability warrant welfare ubiquitous
+"""
+
+_WORD_RE = re.compile(r"[A-Za-z]+")
+
+
+def _load():
+    intermediate = set(_INTERMEDIATE.split())
+    advanced = set(_ADVANCED.split())
+    if os.path.exists(LEXICON_EXTRA_PATH):
+        with open(LEXICON_EXTRA_PATH, encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1] in ("intermediate", "advanced"):
+                    (advanced if parts[1] == "advanced" else intermediate).add(parts[0].lower())
+    intermediate -= advanced
+    return frozenset(intermediate), frozenset(advanced)
+
+
+INTERMEDIATE, ADVANCED = _load()
+
+
+@lru_cache(maxsize=65536)
+def lemma(word):
+    # Cheap suffix stripping; good enough to map inflections onto listed lemmas
+    word = word.lower()
+    if word in ADVANCED or word in INTERMEDIATE:
+        return word
+    for suffix, replacements in (
+        ("ies", ("y",)), ("ied", ("y",)), ("ying", ("y", "ie")),
+        ("ing", ("", "e")), ("ed", ("", "e")), ("es", ("", "e")), ("s", ("",)),
+        ("ly", ("", "le")), ("ally", ("al", "")),
+    ):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            stem = word[:-len(suffix)]
+            for replacement in replacements:
+                candidate = stem + replacement
+                if candidate in ADVANCED or candidate in INTERMEDIATE:
+                    return candidate
+            if len(stem) > 3 and stem[-1] == stem[-2]:
+                # Doubled consonant: "committed" -> "commit"
+                if stem[:-1] in ADVANCED or stem[:-1] in INTERMEDIATE:
+                    return stem[:-1]
+    return word
+
+
+def level(word):
+    base = lemma(word)
+    if base in ADVANCED:
+        return "advanced"
+    if base in INTERMEDIATE:
+        return "intermediate"
+    return "basic"
+
+
+def profile(text):
+    # Distinct lemmas per level, in order of first appearance
+    seen = {}
+    for word in _WORD_RE.findall(text):
+        base = lemma(word)
+        if base not in seen:
+            seen[base] = level(base)
+    advanced = [w for w, lvl in seen.items() if lvl == "advanced"]
+    intermediate = [w for w, lvl in seen.items() if lvl == "intermediate"]
+    return {
+        'advanced': advanced,
+        'intermediate': intermediate,
+        'advanced_count': len(advanced),
+        'intermediate_count': len(intermediate),
+    }
@@ -0,0 +1,499 @@
+import time
+import random
+import asyncio
+import logging
+import importlib.util
+from collections import deque
+
+import httpx
+
+import metrics
+import tracing
+
+log = logging.getLogger(__name__)
+
+# Gemini gateway: every model call goes through LLMGateway.generate, which picks
+# a model per task type from a ranked list using rolling latency and error
+# rates, and falls back down the list when a call fails. Latency is tracked per
+# (task, model): an essay and an OCR call on the same model take very different
+# times.
+
+# Ranked models per task type; the first healthy model within the task's
+# latency budget wins
+ROUTES = {
+    'essay': ["gemini-2.0-flash", "gemini-1.5-flash", "gemini-2.0-flash-lite"],
+    'refine': ["gemini-2.0-flash", "gemini-1.5-flash", "gemini-2.0-flash-lite"],
+    # Essay analysis and grammar recommendations (long structured output on the full essay)
+    'analysis': ["gemini-2.0-flash", "gemini-2.0-flash-lite", "gemini-1.5-flash"],
+    'ocr': ["gemini-2.0-flash", "gemini-1.5-flash", "gemini-2.0-flash-lite"],
+    # Short OCR images, small analyses, paragraph re-scoring
+    'light': ["gemini-2.0-flash-lite", "gemini-2.0-flash", "gemini-1.5-flash"],
+}
+
+# p95 latency (seconds) above which a model is passed over for a faster one
+LATENCY_BUDGETS = {
+    'essay': 20.0,
+    'refine': 20.0,
+    'analysis': 12.0,
+    'ocr': 12.0,
+    'light': 6.0,
+}
+
+ROUTER_WINDOW_SECONDS = 300     # calls older than this no longer count
+ROUTER_MIN_SAMPLES = 5          # fewer calls than this: trust the ranking
+ROUTER_MAX_ERROR_RATE = 0.5     # above this a model is unhealthy until errors age out
+GEMINI_MAX_CONCURRENT = 8
+
+# Request hedging: a call still running at this percentile of the task's recent
+# latency on that model gets a duplicate; the first result wins and the other is
+# cancelled
+HEDGE_REQUESTS = True
+HEDGED_TASKS = {'analysis', 'ocr', 'light'}
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20          # no hedging until the percentile means something
+HEDGE_MIN_DELAY = 0.5           # seconds
+HEDGE_BUDGET = 0.05             # extra calls allowed, as a fraction of hedgeable calls
+HEDGE_BURST = 5                 # hedges that can be saved up during quiet periods
+HEDGE_SHADOW_SAMPLE = 0.1       # losing primaries left to finish, to estimate the unhedged tail
+
+# Shared HTTP transport for the Gemini client: pooled keep-alive connections,
+# HTTP/2 when the h2 package is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+GEMINI_HTTP_MAX_CONNECTIONS = 32
+GEMINI_HTTP_KEEPALIVE_CONNECTIONS = 16
+GEMINI_HTTP_KEEPALIVE_EXPIRY = 120.0    # seconds; idle connections are closed before the server drops them
+GEMINI_TIMEOUT_MS = 60_000
+GEMINI_WARM_CONNECTIONS = 2             # connections opened at startup
+GEMINI_KEEP_WARM_INTERVAL = 60          # seconds of idleness before a health-check ping
+
+# Circuit breaker around the whole backend: after too many failed calls,
+# requests fail fast until half-open probes succeed again
+BREAKER_WINDOW_SECONDS = 60
+BREAKER_MIN_CALLS = 10          # calls in the window before the error rate can open it
+BREAKER_ERROR_RATE = 0.5
+BREAKER_OPEN_SECONDS = 30       # wait before letting probes through
+BREAKER_HALF_OPEN_PROBES = 1    # probes allowed at once while half-open
+BREAKER_CLOSE_AFTER = 3         # successful probes needed to close again
+
+
+class BackendUnavailable(Exception):
+    # Raised without calling Gemini while the circuit breaker is open
+    def __init__(self, retry_after):
+        super().__init__(f"Gemini backend unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def _weighted_percentile(samples, q):
+    # samples: (value, weight) pairs
+    samples = sorted(samples)
+    total = sum(weight for _, weight in samples)
+    if not total:
+        return None
+    running = 0.0
+    for value, weight in samples:
+        running += weight
+        if running >= q * total:
+            return value
+    return samples[-1][0]
+
+
+def _censored_percentile(samples, q):
+    # samples: (latency, completed). Cancelled calls are right-censored, they
+    # would have taken at least that long; Kaplan-Meier estimate. When the
+    # censored tail hides the percentile, the longest latency seen is returned
+    # as a lower bound
+    samples = sorted(samples, key=lambda sample: (sample[0], not sample[1]))
+    at_risk = len(samples)
+    survival = 1.0
+    for latency, completed in samples:
+        if completed:
+            survival *= 1 - 1 / at_risk
+            if 1 - survival >= q:
+                return latency
+        at_risk -= 1
+    return samples[-1][0] if samples else None
+
+
+def http_options(base_url=None):
+    # Pass as genai.Client(http_options=...); a custom transport also keeps the SDK on httpx.
+    # base_url points the client at another endpoint, e.g. the load test's stub server
+    from google.genai import types
+    transport = httpx.AsyncHTTPTransport(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=GEMINI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=GEMINI_HTTP_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=GEMINI_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        retries=1,  # reconnect once when a pooled connection turns out to be dead
+    )
+    return types.HttpOptions(base_url=base_url, timeout=GEMINI_TIMEOUT_MS, async_client_args={'transport': transport})
+
+
+class ModelStats:
+    def __init__(self, window=ROUTER_WINDOW_SECONDS):
+        self.window = window
+        self._calls = deque()   # (timestamp, latency, ok); ok is None for a cancelled call
+        self.totals = {'calls': 0, 'errors': 0, 'cancelled': 0}
+
+    def record(self, latency, ok):
+        self._calls.append((time.monotonic(), latency, ok))
+        self.totals['calls'] += 1
+        if not ok:
+            self.totals['errors'] += 1
+
+    def record_cancelled(self, elapsed):
+        # A hedge loser or abandoned call: only a lower bound on its latency
+        self._calls.append((time.monotonic(), elapsed, None))
+        self.totals['cancelled'] += 1
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.window
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+        return self._calls
+
+    def samples(self):
+        return len(self._recent())
+
+    def error_rate(self):
+        outcomes = [ok for _, _, ok in self._recent() if ok is not None]
+        return sum(1 for ok in outcomes if not ok) / len(outcomes) if outcomes else 0.0
+
+    def percentile(self, q):
+        return _censored_percentile([(latency, ok is not None) for _, latency, ok in self._recent()
+                                     if ok is not False], q)
+
+    def healthy(self):
+        return self.samples() < ROUTER_MIN_SAMPLES or self.error_rate() <= ROUTER_MAX_ERROR_RATE
+
+    def snapshot(self):
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            **self.totals,
+            'recent': self.samples(),
+            'error_rate': round(self.error_rate(), 3),
+            'p50': round(p50, 3) if p50 is not None else None,
+            'p95': round(p95, 3) if p95 is not None else None,
+        }
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, window=BREAKER_WINDOW_SECONDS, min_calls=BREAKER_MIN_CALLS,
+                 error_rate=BREAKER_ERROR_RATE, open_seconds=BREAKER_OPEN_SECONDS,
+                 probes=BREAKER_HALF_OPEN_PROBES, close_after=BREAKER_CLOSE_AFTER):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.close_after = close_after
+        self.state = self.CLOSED
+        self._outcomes = deque()    # (timestamp, ok) while closed
+        self._opened_at = 0.0
+        self._probing = 0
+        self._probe_successes = 0
+        self.transitions = {}       # "closed->open" -> count
+        self.stats = {'rejected': 0}
+
+    def _move(self, state):
+        key = f"{self.state}->{state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        log.warning("Circuit breaker %s", key)
+        self.state = state
+        self._outcomes.clear()
+        self._probing = 0
+        self._probe_successes = 0
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+
+    def retry_after(self):
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self):
+        # True when a call may go out; half-open admits a limited number of probes
+        if self.state == self.OPEN:
+            if self.retry_after() > 0:
+                self.stats['rejected'] += 1
+                return False
+            self._move(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probing >= self.probes:
+                self.stats['rejected'] += 1
+                return False
+            self._probing += 1
+        return True
+
+    def release(self):
+        # A call that ended without an outcome (cancelled)
+        if self.state == self.HALF_OPEN and self._probing:
+            self._probing -= 1
+
+    def record(self, ok):
+        if self.state == self.HALF_OPEN:
+            self._probing = max(0, self._probing - 1)
+            if not ok:
+                self._move(self.OPEN)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.close_after:
+                self._move(self.CLOSED)
+            return
+        if self.state != self.CLOSED:
+            return
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        while self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+        failures = sum(1 for _, outcome in self._outcomes if not outcome)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+            self._move(self.OPEN)
+
+    def is_open(self):
+        return self.state == self.OPEN and self.retry_after() > 0
+
+    def snapshot(self):
+        return {
+            'state': self.state,
+            'retry_after': round(self.retry_after(), 1) if self.state == self.OPEN else 0.0,
+            'transitions': dict(self.transitions),
+            **self.stats,
+        }
+
+
+class LLMGateway:
+    def __init__(self, client=None, routes=ROUTES, budgets=LATENCY_BUDGETS,
+                 max_concurrent=GEMINI_MAX_CONCURRENT, client_factory=None):
+        # client_factory: builds the client on first use instead, keeping the SDK import off startup
+        self._client = client
+        self._client_factory = client_factory
+        self.routes = routes
+        self.budgets = budgets
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.breaker = CircuitBreaker()
+        self.models = {}            # (task, model) -> ModelStats
+        self._last_used = 0.0
+        self.http_stats = {'warm_connections': 0, 'pings': 0, 'ping_failures': 0}
+        self.stats = {'calls': 0, 'fallbacks': 0, 'rerouted': 0, 'failed': 0}
+        self.hedge_stats = {'eligible': 0, 'hedged': 0, 'hedge_wins': 0, 'skipped_budget': 0}
+        self._hedge_tokens = 1.0
+        self._task_latencies = {}   # task -> recent end-to-end latencies of hedgeable calls
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def _model_stats(self, task, model):
+        key = (task, model)
+        if key not in self.models:
+            self.models[key] = ModelStats()
+        return self.models[key]
+
+    def plan(self, task):
+        # Models to try in order: healthy ones first, those within budget ahead of slow ones
+        ranked = self.routes[task]
+        budget = self.budgets.get(task)
+        healthy = [m for m in ranked if self._model_stats(task, m).healthy()]
+        unhealthy = [m for m in ranked if m not in healthy]
+
+        def within_budget(model):
+            stats = self._model_stats(task, model)
+            p95 = stats.percentile(0.95)
+            return budget is None or stats.samples() < ROUTER_MIN_SAMPLES or p95 is None or p95 <= budget
+        fast = [m for m in healthy if within_budget(m)]
+        # When nothing meets the budget, the fastest healthy model goes first
+        slow = sorted((m for m in healthy if m not in fast),
+                      key=lambda m: self._model_stats(task, m).percentile(0.5) or 0.0)
+        return fast + slow + unhealthy
+
+    async def _call(self, task, model, contents, site, acquired=None):
+        stats = self._model_stats(task, model)
+        async with self._slots:
+            if acquired is not None:
+                acquired.set()
+            started = self._last_used = time.monotonic()
+            metrics.inflight.labels("gemini").inc()
+            try:
+                with tracing.span("gemini", model=model, site=site):
+                    response = await self.client.aio.models.generate_content(model=model, contents=contents)
+            except asyncio.CancelledError:
+                stats.record_cancelled(time.monotonic() - started)
+                raise
+            except Exception:
+                stats.record(time.monotonic() - started, False)
+                raise
+            finally:
+                metrics.inflight.labels("gemini").dec()
+        latency = time.monotonic() - started
+        stats.record(latency, True)
+        metrics.gemini_seconds.labels(site, model).observe(latency)
+        metrics.observe_tokens(site, response)
+        return response
+
+    def _hedge_delay(self, task, model):
+        stats = self._model_stats(task, model)
+        if stats.samples() < HEDGE_MIN_SAMPLES:
+            return None
+        delay = stats.percentile(HEDGE_PERCENTILE)
+        return None if delay is None else max(HEDGE_MIN_DELAY, delay)
+
+    async def _hedged_call(self, task, model, contents, site):
+        self.hedge_stats['eligible'] += 1
+        self._hedge_tokens = min(HEDGE_BURST, self._hedge_tokens + HEDGE_BUDGET)
+        delay = self._hedge_delay(task, model)
+        acquired = asyncio.Event()
+        primary = asyncio.ensure_future(self._call(task, model, contents, site, acquired))
+        pending = {primary}
+        shadowed = False
+        try:
+            # The hedge timer starts once the primary has a slot, not while it queues
+            waiter = asyncio.ensure_future(acquired.wait())
+            await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            started = time.monotonic()
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    if self._hedge_tokens >= 1:
+                        self._hedge_tokens -= 1
+                        self.hedge_stats['hedged'] += 1
+                        pending.add(asyncio.ensure_future(self._call(task, model, contents, site)))
+                    else:
+                        self.hedge_stats['skipped_budget'] += 1
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    if finished.exception() is None:
+                        elapsed = time.monotonic() - started
+                        # (latency, latency without hedging, weight of the unhedged sample)
+                        entry = [elapsed, elapsed, 1.0]
+                        if finished is not primary:
+                            self.hedge_stats['hedge_wins'] += 1
+                            shadowed = primary in pending and random.random() < HEDGE_SHADOW_SAMPLE
+                            entry = [elapsed, None, 1 / HEDGE_SHADOW_SAMPLE if shadowed else 0.0]
+                            if shadowed:
+                                primary.add_done_callback(lambda t: self._shadow_done(t, entry, started))
+                        self._task_latencies.setdefault(task, deque(maxlen=1000)).append(entry)
+                        return finished.result()
+                    error = finished.exception()
+            raise error
+        finally:
+            for pending_task in pending:
+                if not (shadowed and pending_task is primary):
+                    pending_task.cancel()
+
+    def _shadow_done(self, task, entry, started):
+        # A losing primary left running so the tail without hedging can be estimated
+        if task.cancelled() or task.exception() is not None:
+            entry[2] = 0.0
+        else:
+            entry[1] = time.monotonic() - started
+
+    async def _attempt(self, task, model, contents, site, hedge):
+        if not (hedge and HEDGE_REQUESTS and task in HEDGED_TASKS):
+            return await self._call(task, model, contents, site)
+        return await self._hedged_call(task, model, contents, site)
+
+    async def generate(self, task, contents, site=None, hedge=True):
+        # site names the calling code in metrics; defaults to the task type.
+        # hedge=False keeps speculative work from doubling its own cost
+        if not self.breaker.allow():
+            raise BackendUnavailable(self.breaker.retry_after())
+        try:
+            response = await self._generate(task, contents, site or task, hedge)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record(False)
+            raise
+        self.breaker.record(True)
+        return response
+
+    async def _generate(self, task, contents, site, hedge):
+        self.stats['calls'] += 1
+        order = self.plan(task)
+        if order[0] != self.routes[task][0]:
+            self.stats['rerouted'] += 1
+        error = None
+        for attempt, model in enumerate(order):
+            if attempt:
+                self.stats['fallbacks'] += 1
+                log.warning("Falling back to %s for %s: %s", model, task, error)
+            try:
+                return await self._attempt(task, model, contents, site, hedge)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+        self.stats['failed'] += 1
+        raise error
+
+    async def _ping(self):
+        # Model metadata lookup: no tokens, but a full round trip on a pooled connection
+        self.http_stats['pings'] += 1
+        try:
+            await self.client.aio.models.get(model=self.routes['essay'][0])
+            return True
+        except Exception as e:
+            self.http_stats['ping_failures'] += 1
+            log.warning("Gemini ping failed: %s", e)
+            return False
+
+    async def warm_up(self, connections=GEMINI_WARM_CONNECTIONS):
+        # Concurrent pings so the pool holds several open connections
+        results = await asyncio.gather(*(self._ping() for _ in range(connections)))
+        self.http_stats['warm_connections'] = sum(results)
+        self._last_used = time.monotonic()
+        return self.http_stats['warm_connections']
+
+    async def keep_warm(self, interval=GEMINI_KEEP_WARM_INTERVAL):
+        # Health-checks idle connections so the first call after a quiet spell doesn't pay for setup
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self._last_used >= interval:
+                await self._ping()
+                self._last_used = time.monotonic()
+
+    def hedge_snapshot(self):
+        tails = {}
+        for task, entries in self._task_latencies.items():
+            p99 = _weighted_percentile([(latency, 1.0) for latency, _, _ in entries], 0.99)
+            unhedged = _weighted_percentile(
+                [(latency, weight) for _, latency, weight in entries if latency is not None and weight], 0.99)
+            tails[task] = {
+                'p50': round(_weighted_percentile([(latency, 1.0) for latency, _, _ in entries], 0.5), 3),
+                'p99': round(p99, 3),
+                'p99_unhedged_estimate': round(unhedged, 3) if unhedged is not None else None,
+                'p99_saved': round(unhedged - p99, 3) if unhedged is not None else None,
+            }
+        eligible = self.hedge_stats['eligible']
+        return {
+            **self.hedge_stats,
+            'hedge_rate': self.hedge_stats['hedged'] / eligible if eligible else 0.0,
+            'tasks': tails,
+        }
+
+    def _models_snapshot(self):
+        by_task = {}
+        for (task, model), stats in self.models.items():
+            by_task.setdefault(task, {})[model] = stats.snapshot()
+        return by_task
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            'models': self._models_snapshot(),
+            'hedging': self.hedge_snapshot(),
+            'breaker': self.breaker.snapshot(),
+            'http': {**self.http_stats, 'http2': HTTP2_AVAILABLE},
+        }
@@ -0,0 +1,152 @@
+import os
+import re
+import sys
+import json
+import queue
+import random
+import logging
+import logging.handlers
+
+import tracing
+
+# Non-blocking logging: handlers on the event loop only drop sampled-out records
+# and put the rest on a queue; a listener thread formats, redacts and writes
+# them to a size-rotated JSON-lines file and to stderr.
+#
+#   log_pipeline.setup()     # once, from main()
+#   log = logging.getLogger(__name__); log.info("...", extra={'chat_id': ...})
+#   log_pipeline.shutdown()  # drains the queue
+LOG_DIR = "logs"
+LOG_FILE = os.path.join(LOG_DIR, "ielts_bot.log")
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+LOG_LEVEL = logging.INFO
+LOG_QUEUE_SIZE = 10_000         # records beyond this are dropped rather than blocking the loop
+LOG_CONSOLE = True
+# Share of records below WARNING kept per logger (prefix match, longest wins);
+# httpx logs every Bot API call, including each long-poll getUpdates
+LOG_SAMPLE_RATES = {
+    'httpx': 0.01,
+    'httpcore': 0.0,
+    'telegram.ext.Updater': 0.1,
+}
+
+# Secrets that must never reach a log line: bot tokens in Bot API URLs and
+# Google API keys
+_REDACTIONS = [
+    (re.compile(r"(?<![0-9])\d{6,}:[A-Za-z0-9_-]{30,}"), "<bot-token>"),
+    (re.compile(r"\bAIza[0-9A-Za-z_-]{35}\b"), "<api-key>"),
+    (re.compile(r"(?i)([?&](?:key|api_key|token)=)[^&\s\"']+"), r"\1<redacted>"),
+]
+
+# LogRecord attributes that are not user-supplied extra= fields
+_STANDARD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+stats = {'queued': 0, 'sampled_out': 0, 'dropped_full': 0}
+_listener = None
+
+
+def redact(text):
+    for pattern, replacement in _REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = LOG_SAMPLE_RATES if rates is None else rates
+        self._by_logger = {}
+
+    def _rate(self, name):
+        rate = self._by_logger.get(name)
+        if rate is None:
+            matches = [prefix for prefix in self.rates if name == prefix or name.startswith(prefix + ".")]
+            rate = self.rates[max(matches, key=len)] if matches else 1.0
+            self._by_logger[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            if rate < 1.0:
+                record.sample_rate = rate
+            return True
+        stats['sampled_out'] += 1
+        return False
+
+
+class _Handoff(logging.handlers.QueueHandler):
+    # Formatting is left to the listener thread, so log arguments must not be
+    # mutated afterwards; only the trace id is taken here, while the record's
+    # context is still current
+    def prepare(self, record):
+        record.trace_id = tracing.current_trace_id()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            stats['queued'] += 1
+        except queue.Full:
+            stats['dropped_full'] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items()
+                     if key not in _STANDARD_FIELDS and value is not None)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return redact(json.dumps(entry, default=str, ensure_ascii=False))
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        return redact(super().format(record))
+
+
+def setup(level=LOG_LEVEL, path=LOG_FILE, console=LOG_CONSOLE):
+    global _listener
+    if _listener is not None:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+    outputs = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(TextFormatter())
+        outputs.append(console_handler)
+
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    handoff = _Handoff(records)
+    handoff.addFilter(SamplingFilter())
+    root = logging.getLogger()
+    root.handlers[:] = [handoff]
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(records, *outputs, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown():
+    global _listener
+    if _listener is not None:
+        _listener.stop()    # writes what is still queued
+        _listener = None
+
+
+def snapshot():
+    return {**stats, 'pending': _listener.queue.qsize() if _listener is not None else 0}
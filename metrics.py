@@ -0,0 +1,300 @@
+import time
+import asyncio
+import logging
+import functools
+from bisect import bisect_left
+
+import tracing
+
+log = logging.getLogger(__name__)
+
+# In-process metrics with a Prometheus text-format scrape endpoint:
+#
+#   curl http://127.0.0.1:9108/metrics
+#
+# Histograms per pipeline stage and handler, in-flight gauges, event-loop lag
+# and Gemini token counts, plus the snapshot() dicts of the caches, gateway
+# and schedulers through registered collectors. GET /ready answers 200 once
+# the startup warm-up is done and 503 before, for deploy readiness probes.
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+LOOP_LAG_INTERVAL = 0.5         # seconds between event-loop lag probes
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_label_text(labelnames, values)} {_number(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        self._default().set(value)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labelnames, values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = f'le="{_number(bound)}"'
+            lines.append(f"{name}_bucket{_label_text(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_label_text(labelnames, values)} {_number(self.sum)}")
+        lines.append(f"{name}_count{_label_text(labelnames, values)} {self.count}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []   # (component, snapshot function)
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, component, snapshot):
+        # snapshot() returns a (nested) dict; numeric leaves become gauge samples
+        self._collectors.append((component, snapshot))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.append("# HELP ielts_component Numeric fields of component snapshots")
+        lines.append("# TYPE ielts_component gauge")
+        for component, snapshot in self._collectors:
+            try:
+                data = snapshot()
+            except Exception as e:
+                log.warning("Metrics collector %s failed: %s", component, e)
+                continue
+            for key, value in _flatten(data):
+                lines.append(f"ielts_component{_label_text(('component', 'key'), (component, key))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(data, prefix=""):
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, path + ".")
+        elif isinstance(value, bool):
+            yield path, int(value)
+        elif isinstance(value, (int, float)):
+            yield path, value
+
+
+REGISTRY = Registry()
+
+stage_seconds = REGISTRY.register(Histogram(
+    "ielts_stage_seconds", "Time spent per pipeline stage", ["stage"]))
+handler_seconds = REGISTRY.register(Histogram(
+    "ielts_handler_seconds", "Time per Telegram handler invocation", ["handler"]))
+handler_errors = REGISTRY.register(Counter(
+    "ielts_handler_errors_total", "Handler invocations that raised", ["handler"]))
+gemini_seconds = REGISTRY.register(Histogram(
+    "ielts_gemini_seconds", "Gemini request latency per call site and model", ["site", "model"]))
+gemini_tokens = REGISTRY.register(Counter(
+    "ielts_gemini_tokens_total", "Gemini tokens per call site", ["site", "kind"]))
+inflight = REGISTRY.register(Gauge(
+    "ielts_inflight", "Work currently in progress", ["kind"]))
+startup_seconds = REGISTRY.register(Gauge(
+    "ielts_startup_seconds", "Seconds from process import to each startup milestone", ["phase"]))
+ready = REGISTRY.register(Gauge(
+    "ielts_ready", "1 once the startup warm-up has finished"))
+loop_lag_seconds = REGISTRY.register(Histogram(
+    "ielts_event_loop_lag_seconds", "Delay of event-loop wakeups beyond their schedule",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)))
+
+
+class timed:
+    # with timed("preprocess"): ... ; also a span in the current trace
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self._span = tracing.span(self.stage)
+        self._span.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        stage_seconds.labels(self.stage).observe(time.perf_counter() - self.started)
+        return self._span.__exit__(*exc)
+
+
+def track_handler(func):
+    # Decorator for async handlers: latency histogram, error count and in-flight gauge
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        inflight.labels("handler").inc()
+        try:
+            with tracing.span(f"handler.{name}"):
+                return await func(*args, **kwargs)
+        except Exception:
+            handler_errors.labels(name).inc()
+            raise
+        finally:
+            inflight.labels("handler").dec()
+            handler_seconds.labels(name).observe(time.perf_counter() - started)
+    return wrapper
+
+
+def observe_tokens(site, response):
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    for kind, field in (("prompt", "prompt_token_count"), ("output", "candidates_token_count"),
+                        ("total", "total_token_count")):
+        count = getattr(usage, field, None)
+        if count:
+            gemini_tokens.labels(site, kind).inc(count)
+
+
+async def monitor_loop_lag(interval=LOOP_LAG_INTERVAL):
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        loop_lag_seconds.observe(max(0.0, time.perf_counter() - expected))
+
+
+_readiness = {'ready': False, 'detail': "starting"}
+
+
+def set_ready(is_ready, detail=""):
+    _readiness.update(ready=is_ready, detail=detail)
+    ready.set(int(is_ready))
+
+
+async def _handle_scrape(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        # Drain the headers; the request body (if any) is ignored
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        path = parts[1].split("?")[0] if len(parts) >= 2 and parts[0] == "GET" else None
+        if path == "/metrics":
+            body = REGISTRY.render().encode("utf-8")
+            status, content_type = "200 OK", "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/ready":
+            body = f"{'ready' if _readiness['ready'] else 'not ready'} {_readiness['detail']}".strip().encode() + b"\n"
+            status = "200 OK" if _readiness['ready'] else "503 Service Unavailable"
+            content_type = "text/plain"
+        else:
+            body, status, content_type = b"not found\n", "404 Not Found", "text/plain"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host=METRICS_HOST, port=METRICS_PORT):
+    # Returns the asyncio server; close() it on shutdown
+    return await asyncio.start_server(_handle_scrape, host, port)
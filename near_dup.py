@@ -0,0 +1,139 @@
+import re
+import zlib
+import numpy as np
+
+# Near-duplicate essay detection settings
+NEAR_DUP_THRESHOLD = 0.8        # estimated Jaccard similarity needed to reuse an analysis
+NEAR_DUP_CAPACITY = 200_000     # essays remembered; the oldest are overwritten first
+NEAR_DUP_PERMUTATIONS = 128
+NEAR_DUP_SHINGLE = 3            # words per shingle
+
+_PRIME = np.uint64((1 << 61) - 1)
+
+# parse_analysis labels, stored as one byte per metric
+METRIC_LABELS = {
+    "Grammar Issues": ["N/A", "Excellent", "Good", "Fair", "Poor"],
+    "Advanced Vocabulary": ["N/A", "Low", "Medium", "Advanced"],
+    "Connector Count": ["N/A", "Low", "Medium", "High"],
+    "Repeated Words": ["N/A", "Low", "Medium", "High"],
+    "Lexical Diversity": ["N/A", "Low", "Medium", "High"],
+    "Avg Sentence Length": ["N/A", "Short", "Medium", "Long"],
+}
+
+
+def _lsh_shape(permutations, threshold):
+    # Pick bands x rows whose S-curve threshold sits just below the target
+    best = None
+    for rows in range(1, permutations + 1):
+        if permutations % rows:
+            continue
+        bands = permutations // rows
+        curve = (1.0 / bands) ** (1.0 / rows)
+        if curve <= threshold and (best is None or curve > best[2]):
+            best = (bands, rows, curve)
+    return best[:2] if best else (permutations, 1)
+
+
+def shingles(essay, size=NEAR_DUP_SHINGLE):
+    words = re.findall(r"[a-z0-9']+", essay.lower())
+    if len(words) < size:
+        words = words or [""]
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD, capacity=NEAR_DUP_CAPACITY,
+                 permutations=NEAR_DUP_PERMUTATIONS):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.permutations = permutations
+        self.bands, self.rows = _lsh_shape(permutations, threshold)
+        rng = np.random.default_rng(7)
+        self._a = rng.integers(1, 1 << 31, size=permutations, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=permutations, dtype=np.uint64)
+        # Everything lives in fixed-size arrays, so memory stays bounded at any volume:
+        # one byte per permutation (b-bit MinHash) plus one slot per band per table entry
+        self._signatures = np.zeros((capacity, permutations), dtype=np.uint8)
+        self._labels = np.zeros((capacity, len(METRIC_LABELS)), dtype=np.uint8)
+        self._bands_x10 = np.zeros(capacity, dtype=np.uint8)
+        self._table_size = capacity * 2
+        self._tables = np.full((self.bands, self._table_size), -1, dtype=np.int32)
+        self._next = 0
+        self._filled = 0
+        self.stats = {'lookups': 0, 'hits': 0, 'adds': 0}
+
+    def signature(self, essay):
+        values = np.fromiter(shingles(essay), dtype=np.uint64)
+        hashed = (values[None, :] * self._a[:, None] + self._b[:, None]) % _PRIME
+        return hashed.min(axis=1)
+
+    def _slots(self, signature):
+        rows = signature.reshape(self.bands, self.rows)
+        # Mix each band into a single table slot
+        keys = np.bitwise_xor.reduce(rows * np.uint64(0x9E3779B97F4A7C15) >> np.uint64(7), axis=1)
+        return (keys % np.uint64(self._table_size)).astype(np.int64)
+
+    def _similarity(self, packed, row):
+        # b-bit MinHash estimate, corrected for chance byte collisions
+        matches = np.count_nonzero(self._signatures[row] == packed) / self.permutations
+        return max(0.0, (matches - 1 / 256) / (1 - 1 / 256))
+
+    def find(self, essay):
+        # Returns (row, estimated Jaccard) of the closest stored essay, or None
+        self.stats['lookups'] += 1
+        if not self._filled:
+            return None
+        signature = self.signature(essay)
+        packed = (signature & np.uint64(0xFF)).astype(np.uint8)
+        candidates = set(int(r) for r in self._tables[np.arange(self.bands), self._slots(signature)] if r >= 0)
+        best = None
+        for row in candidates:
+            similarity = self._similarity(packed, row)
+            if best is None or similarity > best[1]:
+                best = (row, similarity)
+        return best
+
+    def lookup(self, essay):
+        found = self.find(essay)
+        if found is None or found[1] < self.threshold:
+            return None
+        self.stats['hits'] += 1
+        return self._decode(found[0])
+
+    def add(self, essay, analysis):
+        signature = self.signature(essay)
+        row = self._next
+        self._signatures[row] = (signature & np.uint64(0xFF)).astype(np.uint8)
+        for i, (metric, labels) in enumerate(METRIC_LABELS.items()):
+            value = analysis.get(metric, "N/A")
+            self._labels[row, i] = labels.index(value) if value in labels else 0
+        try:
+            self._bands_x10[row] = int(round(float(analysis.get("Predicted IELTS Band")) * 10))
+        except (TypeError, ValueError):
+            self._bands_x10[row] = 0
+        self._tables[np.arange(self.bands), self._slots(signature)] = row
+        self._next = (row + 1) % self.capacity
+        self._filled = min(self._filled + 1, self.capacity)
+        self.stats['adds'] += 1
+
+    def _decode(self, row):
+        analysis = {
+            metric: labels[self._labels[row, i]]
+            for i, (metric, labels) in enumerate(METRIC_LABELS.items())
+        }
+        band = self._bands_x10[row]
+        analysis["Predicted IELTS Band"] = str(band / 10) if band else "N/A"
+        return analysis
+
+    def memory_bytes(self):
+        return sum(a.nbytes for a in (self._signatures, self._labels, self._bands_x10, self._tables))
+
+    def snapshot(self):
+        lookups = self.stats['lookups']
+        return {
+            **self.stats,
+            'entries': self._filled,
+            'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+            'memory_mb': self.memory_bytes() / 2**20,
+        }
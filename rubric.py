@@ -0,0 +1,175 @@
+import math
+
+# Executable IELTS scoring rubric. The same tables turn category labels into
+# points and a band, classify locally measured values into labels, and render
+# the rubric text used in the Gemini prompts.
+
+RUBRIC = {
+    "Grammar Issues": {
+        'measure': "number of misspellings and grammatical errors",
+        # (label, points, lowest measured value for the label, criteria text)
+        'labels': [
+            ("Excellent", 5, 0, "0-1 minor errors"),
+            ("Good", 4, 2, "2-3 minor errors"),
+            ("Fair", 3, 4, "4-5 errors or noticeable grammar issues"),
+            ("Poor", 2, 6, "6+ errors or significant grammar problems"),
+        ],
+    },
+    "Advanced Vocabulary": {
+        'measure': "number of sophisticated terms, formal language and specialized vocabulary",
+        'labels': [
+            ("Low", 2, 0, "frequent use of simple words (under 5 advanced words)"),
+            ("Medium", 4, 5, "a mix of everyday and more advanced terms (5-10 advanced words)"),
+            ("Advanced", 5, 11, "sophisticated, formal and specialized vocabulary (11+ advanced words)"),
+        ],
+    },
+    "Connector Count": {
+        'measure': "number of connectors and conjunctions (e.g., however, furthermore, and)",
+        'labels': [
+            ("Low", 2, 0, "0-5 connectors"),
+            ("Medium", 4, 6, "6-12 connectors"),
+            ("High", 5, 13, "13+ connectors"),
+        ],
+    },
+    "Repeated Words": {
+        'measure': "number of repeated nouns/verbs",
+        'labels': [
+            ("Low", 5, 0, "0-2 repeated words"),
+            ("Medium", 4, 3, "3-4 repeated words"),
+            ("High", 3, 5, "5+ repeated words"),
+        ],
+    },
+    "Lexical Diversity": {
+        'measure': "lexical density = content words (nouns, verbs, adjectives, adverbs) / total words",
+        'labels': [
+            ("Low", 2, 0.0, "lexical density < 0.40"),
+            ("Medium", 4, 0.40, "0.40 <= lexical density < 0.60"),
+            ("High", 5, 0.60, "lexical density >= 0.60"),
+        ],
+    },
+    "Avg Sentence Length": {
+        'measure': "total words / total sentences",
+        'labels': [
+            ("Short", 3, 0.0, "5-10 words per sentence"),
+            ("Medium", 4, 10.5, "11-20 words per sentence"),
+            ("Long", 5, 20.5, "more than 20 words per sentence"),
+        ],
+    },
+}
+
+# (band, lowest points, highest points, band range text)
+BAND_RANGES = [
+    (3, 6, 15, "3.0 - 4.5"),
+    (4, 16, 19, "4.0 - 5.0"),
+    (5, 20, 22, "5.0 - 6.0"),
+    (6, 23, 24, "6.0 - 6.5"),
+    (7, 25, 27, "7.0 - 8.0"),
+    (8, 28, 29, "8.0 - 9.0"),
+    (9, 30, 30, "9.0"),
+]
+
+# Order in which categories give up points when building a band's target profile
+_DOWNGRADE_ORDER = [
+    "Grammar Issues", "Advanced Vocabulary", "Lexical Diversity",
+    "Avg Sentence Length", "Connector Count", "Repeated Words",
+]
+
+
+def _labels_by_points(category):
+    return sorted(RUBRIC[category]['labels'], key=lambda entry: entry[1], reverse=True)
+
+
+def label_names(category):
+    return [entry[0] for entry in RUBRIC[category]['labels']]
+
+
+def classify(category, value):
+    # Label for a locally measured value (error count, density, ...)
+    chosen = RUBRIC[category]['labels'][0][0]
+    for label, _, minimum, _ in RUBRIC[category]['labels']:
+        if value >= minimum:
+            chosen = label
+    return chosen
+
+
+def points_for(category, label):
+    for name, points, _, _ in RUBRIC[category]['labels']:
+        if name == label:
+            return points
+    return None
+
+
+def total_points(labels):
+    # None when any category is missing or unrecognised
+    total = 0
+    for category in RUBRIC:
+        points = points_for(category, labels.get(category))
+        if points is None:
+            return None
+        total += points
+    return total
+
+
+def band_for_points(points):
+    for band, low, high, _ in BAND_RANGES:
+        if low <= points <= high:
+            return band
+    return BAND_RANGES[0][0] if points < BAND_RANGES[0][1] else BAND_RANGES[-1][0]
+
+
+def predict_band(labels):
+    points = total_points(labels)
+    return None if points is None else band_for_points(points)
+
+
+def apply_band(analysis):
+    # Fill "Predicted IELTS Band" from the category labels when they are all known
+    band = predict_band(analysis)
+    if band is not None:
+        analysis["Predicted IELTS Band"] = f"{band:.1f}"
+    return analysis
+
+
+def target_profile(band):
+    # Label per category whose total points land inside the band's range
+    band = max(BAND_RANGES[0][0], min(BAND_RANGES[-1][0], int(math.floor(band))))
+    # Aim for the middle of the band's point range
+    target = next((low + high) // 2 for b, low, high, _ in BAND_RANGES if b == band)
+    steps = {category: 0 for category in RUBRIC}
+    profile = {category: _labels_by_points(category)[0][0] for category in RUBRIC}
+    while total_points(profile) > target:
+        moved = False
+        for category in _DOWNGRADE_ORDER:
+            ordered = _labels_by_points(category)
+            if steps[category] + 1 < len(ordered):
+                steps[category] += 1
+                profile[category] = ordered[steps[category]][0]
+                moved = True
+                if total_points(profile) <= target:
+                    break
+        if not moved:
+            break
+    return profile
+
+
+# Prompt text rendered from the tables
+
+def criteria_text():
+    lines = []
+    for number, (category, spec) in enumerate(RUBRIC.items(), 1):
+        lines.append(f"{number}. {category}: {'/'.join(label_names(category))} based on the {spec['measure']}:")
+        for label, _, _, criteria in spec['labels']:
+            lines.append(f"  - {label}: {criteria}")
+    return "\n".join(lines)
+
+
+def format_text():
+    return "\n".join(f"{category}: [{'/'.join(label_names(category))}]" for category in RUBRIC)
+
+
+def target_text(band):
+    lines = []
+    for category, label in target_profile(band).items():
+        criteria = next(c for name, _, _, c in RUBRIC[category]['labels'] if name == label)
+        lines.append(f"- {category}: {label}, {criteria}")
+    return "\n".join(lines)
@@ -0,0 +1,189 @@
+import time
+import asyncio
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+import tracing
+
+# Outbound Bot API scheduler: every request waits for the global and (except
+# deletes) the per-chat token bucket, flood waits are retried transparently, and queued
+# edits of the same message with the same method are coalesced (edits queued
+# behind a delete of their message are dropped).
+
+SEND_GLOBAL_RATE = 30.0             # requests per second across all chats
+SEND_GLOBAL_BURST = 30
+SEND_PRIVATE_RATE = 1.0             # requests per second per private chat
+SEND_GROUP_RATE = 20 / 60           # requests per second per group chat
+SEND_PRIVATE_BURST = 8              # a flow's replies go out without queueing; Telegram allows short bursts
+SEND_GROUP_BURST = 3
+SEND_MAX_RETRIES = 3                # RetryAfter retries before the error reaches the handler
+SEND_IDLE_CHAT_SECONDS = 600        # idle per-chat buckets are dropped after this
+
+# Not sends: never queued behind user-facing traffic
+UNLIMITED_ENDPOINTS = frozenset({"getUpdates", "getMe", "getFile", "answerCallbackQuery", "deleteWebhook"})
+# Cleanup, not a message: only the global bucket applies
+CHAT_EXEMPT_ENDPOINTS = frozenset({"deleteMessage"})
+EDIT_ENDPOINTS = frozenset({"editMessageText", "editMessageCaption", "editMessageMedia", "editMessageReplyMarkup"})
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()     # FIFO, so a chat's messages keep their order
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, skip=None):
+        # False when skip() turned true while waiting; no token is spent then
+        async with self._lock:
+            while True:
+                if skip is not None and skip():
+                    return False
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0)
+                if wait <= 0:
+                    self.tokens -= 1
+                    return True
+                await asyncio.sleep(min(wait, 0.5) if skip is not None else wait)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class SendScheduler(BaseRateLimiter):
+    def __init__(self, max_retries=SEND_MAX_RETRIES):
+        self.max_retries = max_retries
+        self._global = TokenBucket(SEND_GLOBAL_RATE, SEND_GLOBAL_BURST)
+        self._chats = {}            # chat_id -> (TokenBucket, last used)
+        self._pending_edits = {}    # (chat_id, message_id, endpoint) -> latest queued edit future
+        self._deleted = set()       # (chat_id, message_id) with a delete queued
+        self._delays = deque(maxlen=2000)
+        self.queued = 0
+        self.stats = {
+            'sent': 0, 'flood_waits': 0, 'flood_wait_seconds': 0.0, 'failed_after_retries': 0,
+            'coalesced_edits': 0, 'dropped_edits': 0, 'max_queued': 0,
+        }
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat_bucket(self, chat_id):
+        now = time.monotonic()
+        if len(self._chats) > 1000:
+            for stale in [c for c, (_, used) in self._chats.items() if now - used > SEND_IDLE_CHAT_SECONDS]:
+                del self._chats[stale]
+        bucket = self._chats.get(chat_id, (None, 0))[0]
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = (TokenBucket(SEND_GROUP_RATE, SEND_GROUP_BURST) if is_group
+                      else TokenBucket(SEND_PRIVATE_RATE, SEND_PRIVATE_BURST))
+        self._chats[chat_id] = (bucket, now)
+        return bucket
+
+    async def _send(self, callback, args, kwargs, chat_id):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    self.stats['failed_after_retries'] += 1
+                    raise
+                retry = e.retry_after
+                seconds = retry.total_seconds() if hasattr(retry, 'total_seconds') else float(retry)
+                self.stats['flood_waits'] += 1
+                self.stats['flood_wait_seconds'] += seconds
+                # Hold back everything else bound for the same place while Telegram cools down
+                (self._chat_bucket(chat_id) if chat_id is not None else self._global).pause(seconds)
+                await asyncio.sleep(seconds)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        with tracing.span(f"telegram.{endpoint}") as span:
+            return await self._process(callback, args, kwargs, endpoint, data, span)
+
+    async def _process(self, callback, args, kwargs, endpoint, data, span):
+        if endpoint in UNLIMITED_ENDPOINTS:
+            return await callback(*args, **kwargs)
+        chat_id = data.get('chat_id')
+        message_key = (chat_id, data.get('message_id')) if data.get('message_id') is not None else None
+        edit = edit_key = None
+        if message_key is not None and endpoint in EDIT_ENDPOINTS:
+            # A later edit of the same message replaces this one while both are queued;
+            # only same-method edits, since editMessageReplyMarkup must not drop a text change
+            edit_key = (*message_key, endpoint)
+            edit = asyncio.get_running_loop().create_future()
+            earlier = self._pending_edits.get(edit_key)
+            self._pending_edits[edit_key] = edit
+            if earlier is not None and not earlier.done():
+                earlier.set_result(edit)
+        elif message_key is not None and endpoint == "deleteMessage":
+            self._deleted.add(message_key)
+
+        queued_at = time.monotonic()
+        self.queued += 1
+        self.stats['max_queued'] = max(self.stats['max_queued'], self.queued)
+        try:
+            superseded = None
+            if edit is not None:
+                superseded = lambda: edit.done() or message_key in self._deleted
+            if chat_id is not None and endpoint not in CHAT_EXEMPT_ENDPOINTS:
+                await self._chat_bucket(chat_id).acquire(superseded)
+            if edit is not None:
+                if edit.done():
+                    self.stats['coalesced_edits'] += 1
+                    # Follow the chain to the edit that is actually sent
+                    result = edit.result()
+                    while isinstance(result, asyncio.Future):
+                        result = await result
+                    return result
+                if message_key in self._deleted:
+                    # The message is going away; the edit would only fail
+                    self.stats['dropped_edits'] += 1
+                    return True
+            await self._global.acquire()
+        finally:
+            self.queued -= 1
+            self._delays.append(time.monotonic() - queued_at)
+            span.set(queue_ms=round((time.monotonic() - queued_at) * 1000, 1))
+
+        try:
+            result = await self._send(callback, args, kwargs, chat_id)
+        except Exception as e:
+            if edit is not None and not edit.done():
+                edit.set_exception(e)
+                edit.exception()    # mark retrieved; only coalesced callers care
+            raise
+        finally:
+            if message_key is not None and endpoint == "deleteMessage":
+                self._deleted.discard(message_key)
+            if edit is not None and self._pending_edits.get(edit_key) is edit:
+                del self._pending_edits[edit_key]
+        self.stats['sent'] += 1
+        if edit is not None and not edit.done():
+            edit.set_result(result)
+        return result
+
+    def snapshot(self):
+        delays = sorted(self._delays)
+
+        def percentile(q):
+            return round(delays[min(len(delays) - 1, int(q * len(delays)))], 3) if delays else None
+        return {
+            **self.stats,
+            'queued': self.queued,
+            'chats': len(self._chats),
+            'queue_delay_p50': percentile(0.5),
+            'queue_delay_p95': percentile(0.95),
+            'queue_delay_max': round(delays[-1], 3) if delays else None,
+        }
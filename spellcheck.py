@@ -0,0 +1,226 @@
+import os
+import re
+import sys
+import hashlib
+import numpy as np
+
+# Offline spelling/grammar pre-pass. Spelling uses a symmetric-delete (SymSpell
+# style) index compiled from a word list into memory-mapped arrays:
+#
+#   python spellcheck.py build frequency_dictionary_en.txt
+#
+# The word list may be plain (one word per line) or "word count" per line.
+SPELL_INDEX_DIR = "cache/spell"
+SPELL_MAX_EDIT_DISTANCE = 2
+SPELL_PREFIX_LENGTH = 7
+SPELL_MIN_WORD_LENGTH = 3       # shorter unknown tokens are ignored
+
+_WORD_RE = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?")
+
+_VOWEL_SOUND_EXCEPTIONS = frozenset("""
+one once unique university universal union unit united uniform unicorn use used useful
+useless user usual usually utility european euro eulogy
+""".split())
+_SILENT_H = frozenset("hour hours hourly honest honestly honour honor honourable honorable heir".split())
+
+_SINGULAR_SUBJECTS = frozenset("he she it everyone everybody nobody someone somebody".split())
+_PLURAL_SUBJECTS = frozenset("i you we they people children".split())
+_PLURAL_ONLY_VERBS = frozenset("are were have do don't".split())
+_SINGULAR_ONLY_VERBS = frozenset("is was has does doesn't".split())
+# A base-form verb after do-support or a modal is correct whatever the subject:
+# "Does he have ...", "Can it be ...", "Why did she do ..."
+_AUXILIARIES = frozenset("""
+do does did don't doesn't didn't can could will would shall should may might must
+can't cannot couldn't won't wouldn't shan't shouldn't mightn't mustn't
+""".split())
+# Doublings that are grammatical: "had had", "that that", "what they do do"
+_ALLOWED_REPEATS = frozenset("had that do".split())
+
+
+def _hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _deletes(word, distance):
+    results = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - results
+        results |= frontier
+    return results
+
+
+def edit_distance(a, b, limit):
+    # Optimal string alignment distance, giving up once it exceeds limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def build_index(word_list_path, directory=SPELL_INDEX_DIR,
+                max_distance=SPELL_MAX_EDIT_DISTANCE, prefix_length=SPELL_PREFIX_LENGTH):
+    words = set()
+    with open(word_list_path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if parts and _WORD_RE.fullmatch(parts[0]):
+                words.add(parts[0].lower())
+    # Words are stored in hash order so a word's position doubles as its id
+    hashed = sorted((_hash(w), w) for w in words)
+    word_hashes = np.array([h for h, _ in hashed], dtype=np.uint64)
+    encoded = [w.encode("utf-8") for _, w in hashed]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(w) for w in encoded])
+
+    delete_hashes, delete_targets = [], []
+    for index, (_, word) in enumerate(hashed):
+        for variant in _deletes(word[:prefix_length], max_distance):
+            delete_hashes.append(_hash(variant))
+            delete_targets.append(index)
+    delete_hashes = np.array(delete_hashes, dtype=np.uint64)
+    order = np.argsort(delete_hashes, kind="stable")
+
+    os.makedirs(directory, exist_ok=True)
+    word_hashes.tofile(os.path.join(directory, "word_hashes.u64"))
+    offsets.tofile(os.path.join(directory, "offsets.u32"))
+    with open(os.path.join(directory, "words.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    delete_hashes[order].tofile(os.path.join(directory, "delete_hashes.u64"))
+    np.array(delete_targets, dtype=np.uint32)[order].tofile(os.path.join(directory, "delete_targets.u32"))
+    with open(os.path.join(directory, "params.txt"), "w") as f:
+        f.write(f"{max_distance} {prefix_length}\n")
+    return len(hashed)
+
+
+class SpellIndex:
+    def __init__(self, directory=SPELL_INDEX_DIR):
+        def load(name, dtype):
+            return np.memmap(os.path.join(directory, name), dtype=dtype, mode="r")
+        with open(os.path.join(directory, "params.txt")) as f:
+            self.max_distance, self.prefix_length = (int(v) for v in f.read().split())
+        self._word_hashes = load("word_hashes.u64", np.uint64)
+        self._offsets = load("offsets.u32", np.uint32)
+        self._words = load("words.bin", np.uint8)
+        self._delete_hashes = load("delete_hashes.u64", np.uint64)
+        self._delete_targets = load("delete_targets.u32", np.uint32)
+
+    def __len__(self):
+        return len(self._word_hashes)
+
+    def _word(self, index):
+        return bytes(self._words[self._offsets[index]:self._offsets[index + 1]]).decode("utf-8")
+
+    def known(self, words):
+        # Vectorized membership test for a batch of lowercase words
+        if not words or not len(self._word_hashes):
+            return [False] * len(words)
+        hashes = np.array([_hash(w) for w in words], dtype=np.uint64)
+        positions = np.searchsorted(self._word_hashes, hashes)
+        positions = np.minimum(positions, len(self._word_hashes) - 1)
+        return list(self._word_hashes[positions] == hashes)
+
+    def suggest(self, word):
+        # Closest dictionary word within the edit distance, or None
+        variants = _deletes(word[:self.prefix_length], self.max_distance)
+        hashes = np.array([_hash(v) for v in variants], dtype=np.uint64)
+        left = np.searchsorted(self._delete_hashes, hashes, side="left")
+        right = np.searchsorted(self._delete_hashes, hashes, side="right")
+        candidates = set()
+        for lo, hi in zip(left, right):
+            candidates.update(int(t) for t in self._delete_targets[lo:hi])
+        best = None
+        for index in candidates:
+            candidate = self._word(index)
+            distance = edit_distance(word, candidate, self.max_distance)
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, candidate)
+        return best[1] if best else None
+
+
+def _rule_errors(tokens):
+    # tokens: list of (start, end, word); returns (start, end, kind, message)
+    errors = []
+    previous = ""
+    for (start, _, word), (_, end, following) in zip(tokens, tokens[1:]):
+        lower, next_lower = word.lower(), following.lower()
+        after_auxiliary = previous in _AUXILIARIES
+        previous = lower
+        if lower == next_lower and lower.isalpha():
+            if lower not in _ALLOWED_REPEATS:
+                errors.append((start, end, "repeated word", f"'{word} {following}'"))
+        elif lower == "a":
+            vowel = next_lower[0] in "aeiou" and next_lower not in _VOWEL_SOUND_EXCEPTIONS
+            if vowel or next_lower in _SILENT_H:
+                errors.append((start, end, "article", f"'a {following}' should be 'an {following}'"))
+        elif lower == "an":
+            consonant = next_lower[0] not in "aeiouh" or next_lower in _VOWEL_SOUND_EXCEPTIONS
+            if consonant or (next_lower[0] == "h" and next_lower not in _SILENT_H):
+                errors.append((start, end, "article", f"'an {following}' should be 'a {following}'"))
+        elif after_auxiliary:
+            continue
+        elif lower in _SINGULAR_SUBJECTS and next_lower in _PLURAL_ONLY_VERBS:
+            errors.append((start, end, "agreement", f"'{word} {following}'"))
+        elif lower in _PLURAL_SUBJECTS and next_lower in _SINGULAR_ONLY_VERBS and not (lower == "i" and next_lower == "was"):
+            errors.append((start, end, "agreement", f"'{word} {following}'"))
+    return errors
+
+
+def check(essay, index=None, extra_known=()):
+    # Error counts and positions; spelling is skipped when no index is available
+    tokens = [(m.start(), m.end(), m.group()) for m in _WORD_RE.finditer(essay)]
+    errors = _rule_errors(tokens)
+    spelling = 0
+    if index is not None:
+        candidates = []
+        for start, end, word in tokens:
+            preceding = essay[max(0, start - 4):start].rstrip(" \t\"'(")
+            sentence_start = not preceding or preceding[-1] in ".!?\n"
+            # Capitalized words mid-sentence are treated as names
+            if len(word) < SPELL_MIN_WORD_LENGTH or (word[0].isupper() and not sentence_start):
+                continue
+            lower = word.lower()
+            if lower not in extra_known:
+                candidates.append((start, end, lower))
+        known = index.known([w for _, _, w in candidates])
+        for (start, end, lower), is_known in zip(candidates, known):
+            if is_known:
+                continue
+            suggestion = index.suggest(lower)
+            # Unknown words with no near neighbour are more likely rare terms than typos
+            if suggestion is not None:
+                errors.append((start, end, "spelling", f"'{essay[start:end]}' -> '{suggestion}'"))
+                spelling += 1
+    errors.sort()
+    return {
+        'spelling': spelling,
+        'grammar': len(errors) - spelling,
+        'total': len(errors),
+        'spelling_checked': index is not None,
+        'errors': errors,
+    }
+
+
+def load_index(directory=SPELL_INDEX_DIR):
+    try:
+        return SpellIndex(directory)
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "build":
+        print(f"Indexed {build_index(sys.argv[2])} words into {SPELL_INDEX_DIR}")
+    else:
+        print("usage: python spellcheck.py build <word list>")
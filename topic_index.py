@@ -0,0 +1,223 @@
+import os
+import re
+import json
+import math
+import time
+import zlib
+import numpy as np
+
+# Topic cache settings. Matching is lexical: it catches rewordings that keep the
+# key terms (another opener or word order, inflections, different instruction
+# wording) but not synonyms or restructured questions. The threshold is
+# calibrated on the labelled rephrasings and near-miss topics in
+# benchmarks/topic_pairs.py, favouring precision: a false hit serves an essay
+# on the wrong question.
+TOPIC_CACHE_DIR = "cache/topics"
+TOPIC_CACHE_THRESHOLD = 0.8     # cosine similarity needed to reuse a cached essay
+TOPIC_VECTOR_DIM = 256
+TOPIC_INITIAL_CAPACITY = 4096
+TOPIC_MAX_CANDIDATES = 256      # rows re-ranked exactly after the signature pre-filter
+TOPIC_FEATURES_VERSION = 2      # bump when _features changes; stored vectors are rebuilt
+
+_SIGNATURE_BITS = 64
+# Function words and opinion framing ("some people think that ...")
+_STOPWORDS = frozenset("""
+a an the of to in on for and or but nor is are was were be been being am that this these those
+it its as at by with from into than then so such there their they them we our you your he she
+his her what which who whom how why when where while whereas however also too very
+some many most more much others other people person someone
+think thinks thought believe believes say says said argue argues argued claim claims feel feels
+often nowadays today now increasingly ever before becoming become becomes common
+should ought must can could would will may might do does did
+""".split())
+# Task instructions shared by unrelated IELTS questions
+_TASK_PATTERN = re.compile(
+    r"\b(?:to what extent do you agree(?: or disagree)?|do you agree(?: or disagree)?|agree or disagree"
+    r"|discuss both(?: these)? views(?: and give your(?: own)? opinion)?|give your(?: own)? opinion"
+    r"|(?:what are|discuss) the(?: main)? (?:advantages and disadvantages|causes and (?:suggest )?solutions|causes|solutions)"
+    r"|do the advantages outweigh the disadvantages|is this a positive or (?:a )?negative (?:development|trend)"
+    r"|suggest(?: some)? solutions|what can be done(?: about (?:it|this))?)\b"
+)
+_SUFFIXES = ("ing", "ed", "es", "s")
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(values):
+        return np.bitwise_count(values)
+else:
+    _POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values):
+        return _POPCOUNT8[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _stem(word):
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def _features(topic):
+    text = _TASK_PATTERN.sub(" ", topic.lower())
+    words = [_stem(w) for w in re.findall(r"[a-z0-9]+", text) if w not in _STOPWORDS]
+    features = list(words)
+    features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        features += [padded[i:i + 4] for i in range(max(len(padded) - 3, 1))]
+    return features
+
+
+def hamming_radius(threshold):
+    # Signature distance that keeps nearly all pairs above the cosine threshold
+    p = math.acos(max(min(threshold, 1.0), -1.0)) / math.pi
+    return int(math.ceil(_SIGNATURE_BITS * p + 3 * math.sqrt(_SIGNATURE_BITS * p * (1 - p)))) + 1
+
+
+def vectorize(topic, dim=TOPIC_VECTOR_DIM):
+    # Signed feature hashing over words, word bigrams and character 4-grams
+    vec = np.zeros(dim, dtype=np.float32)
+    for feature in _features(topic):
+        h = zlib.crc32(feature.encode("utf-8"))
+        vec[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+class TopicIndex:
+    def __init__(self, directory=TOPIC_CACHE_DIR, threshold=TOPIC_CACHE_THRESHOLD,
+                 dim=TOPIC_VECTOR_DIM, capacity=TOPIC_INITIAL_CAPACITY):
+        self.directory = directory
+        self.threshold = threshold
+        self.dim = dim
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._signatures_path = os.path.join(directory, "signatures.u64")
+        self._bands_path = os.path.join(directory, "bands.u8")
+        self._entries_path = os.path.join(directory, "entries.jsonl")
+        self._meta_path = os.path.join(directory, "index.json")
+        # Fixed hyperplanes so signatures stay valid across restarts
+        self._planes = np.random.default_rng(1234).standard_normal((dim, _SIGNATURE_BITS)).astype(np.float32)
+        self._bit_weights = (np.uint64(1) << np.arange(_SIGNATURE_BITS, dtype=np.uint64))
+        self.stats = {'lookups': 0, 'hits': 0, 'adds': 0, 'lookup_seconds': 0.0}
+
+        self._offsets = []
+        if os.path.exists(self._entries_path):
+            with open(self._entries_path, "rb") as f:
+                offset = 0
+                for line in f:
+                    if line.endswith(b"\n"):
+                        self._offsets.append(offset)
+                    offset += len(line)
+        self._count = len(self._offsets)
+        self._open(max(capacity, self._count, 1))
+        meta = {'features': TOPIC_FEATURES_VERSION, 'dim': dim}
+        stored = None
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                stored = json.load(f)
+        if stored != meta:
+            self._reindex()
+            with open(self._meta_path, "w") as f:
+                json.dump(meta, f)
+
+    def _open(self, capacity):
+        self._capacity = capacity
+        self._vectors = self._map(self._vectors_path, np.float32, (capacity, self.dim))
+        self._signatures = self._map(self._signatures_path, np.uint64, (capacity,))
+        self._bands = self._map(self._bands_path, np.uint8, (capacity,))
+
+    @staticmethod
+    def _map(path, dtype, shape):
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _reindex(self):
+        # Vectors from an older feature set are recomputed from the stored topics
+        if not self._count:
+            return
+        with open(self._entries_path, "rb") as f:
+            for row, line in zip(range(self._count), f):
+                entry = json.loads(line)
+                vec = vectorize(entry['topic'], self.dim)
+                self._vectors[row] = vec
+                self._signatures[row] = self._signature(vec)
+                self._bands[row] = entry['band']
+        self.flush()
+
+    def _grow(self):
+        self.flush()
+        self._open(self._capacity * 2)
+
+    def _signature(self, vec):
+        bits = (vec @ self._planes) > 0
+        return np.bitwise_or.reduce(self._bit_weights[bits], initial=np.uint64(0))
+
+    def __len__(self):
+        return self._count
+
+    def add(self, topic, band, essay):
+        if self._count >= self._capacity:
+            self._grow()
+        vec = vectorize(topic, self.dim)
+        row = self._count
+        self._vectors[row] = vec
+        self._signatures[row] = self._signature(vec)
+        self._bands[row] = band
+        # The entries line is written last, so a crash never leaves a row without its essay
+        line = (json.dumps({'topic': topic, 'band': int(band), 'essay': essay}) + "\n").encode("utf-8")
+        with open(self._entries_path, "ab") as f:
+            self._offsets.append(f.tell())
+            f.write(line)
+        self._count += 1
+        self.stats['adds'] += 1
+
+    def search(self, topic, band, threshold=None):
+        # Returns (row, similarity) of the closest cached topic at this band, or None;
+        # the signature pre-filter is as wide as the threshold needs
+        start = time.perf_counter()
+        try:
+            if not self._count:
+                return None
+            vec = vectorize(topic, self.dim)
+            n = self._count
+            distances = _popcount(self._signatures[:n] ^ self._signature(vec))
+            radius = hamming_radius(self.threshold if threshold is None else threshold)
+            candidates = np.flatnonzero((distances <= radius) & (self._bands[:n] == band))
+            if not len(candidates):
+                return None
+            if len(candidates) > TOPIC_MAX_CANDIDATES:
+                closest = np.argpartition(distances[candidates], TOPIC_MAX_CANDIDATES)[:TOPIC_MAX_CANDIDATES]
+                candidates = candidates[closest]
+            scores = self._vectors[candidates] @ vec
+            best = int(np.argmax(scores))
+            return int(candidates[best]), float(scores[best])
+        finally:
+            self.stats['lookups'] += 1
+            self.stats['lookup_seconds'] += time.perf_counter() - start
+
+    def lookup(self, topic, band, threshold=None):
+        threshold = self.threshold if threshold is None else threshold
+        found = self.search(topic, band, threshold)
+        if found is None or found[1] < threshold:
+            return None
+        self.stats['hits'] += 1
+        with open(self._entries_path, "rb") as f:
+            f.seek(self._offsets[found[0]])
+            return json.loads(f.readline())['essay']
+
+    def flush(self):
+        for array in (self._vectors, self._signatures, self._bands):
+            array.flush()
+
+    def snapshot(self):
+        lookups = self.stats['lookups']
+        return {
+            **self.stats,
+            'entries': self._count,
+            'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+            'avg_lookup_ms': self.stats['lookup_seconds'] / lookups * 1000 if lookups else 0.0,
+        }
@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import contextvars
+from collections import deque
+
+from telegram.ext import BaseUpdateProcessor
+
+log = logging.getLogger(__name__)
+
+# Per-update tracing. Every Telegram update opens a trace; stages, Gemini
+# attempts and Bot API sends add child spans through the context variable, so
+# tasks spawned from a handler land in the same trace. Finished traces are
+# kept when sampled or slower than TRACE_SLOW_SECONDS, and written as JSON
+# lines to a file and/or POSTed to a collector.
+TRACE_SAMPLE_RATE = 0.05
+TRACE_SLOW_SECONDS = 20.0       # slower traces are always kept, in TRACE_SLOW_FILE too
+TRACE_DIR = "logs"
+TRACE_FILE = os.path.join(TRACE_DIR, "traces.jsonl")
+TRACE_SLOW_FILE = os.path.join(TRACE_DIR, "slow_traces.jsonl")
+TRACE_COLLECTOR_URL = None      # e.g. "http://127.0.0.1:9411/traces"; JSON list of traces per POST
+TRACE_FLUSH_INTERVAL = 2.0
+TRACE_MAX_SPANS = 500           # per trace; later spans are counted but dropped
+TRACE_MAX_PENDING = 1000        # finished traces waiting for export
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def _new_id(bits=64):
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Trace:
+    def __init__(self, name):
+        self.trace_id = _new_id(128)
+        self.name = name
+        self.started = time.time()
+        self.sampled = random.random() < TRACE_SAMPLE_RATE
+        self.spans = []
+        self.dropped_spans = 0
+        self.finished = False
+
+
+class Span:
+    def __init__(self, trace, name, parent, attributes):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.error = None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.offset = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.offset
+        _current.reset(self._token)
+        if exc is not None:
+            self.error = "cancelled" if exc_type is asyncio.CancelledError else f"{exc_type.__name__}: {exc}"
+        trace = self.trace
+        if trace.finished:
+            return False
+        if len(trace.spans) < TRACE_MAX_SPANS:
+            trace.spans.append(self)
+        else:
+            trace.dropped_spans += 1
+        if self.parent_id is None:
+            exporter.finish(trace, self)
+        return False
+
+
+class _NoSpan:
+    # Stand-in outside any trace (background workers, startup)
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def start_trace(name, **attributes):
+    trace = Trace(name)
+    return Span(trace, name, None, attributes)
+
+
+def span(name, **attributes):
+    # with tracing.span("gemini", model=...): ... ; no-op outside a trace
+    parent = _current.get()
+    if parent is None:
+        return _NoSpan()
+    return Span(parent.trace, name, parent, attributes)
+
+
+def current_trace_id():
+    parent = _current.get()
+    return parent.trace.trace_id if parent is not None else None
+
+
+class TraceExporter:
+    def __init__(self):
+        self._pending = deque(maxlen=TRACE_MAX_PENDING)
+        self.stats = {'traces': 0, 'kept': 0, 'slow': 0, 'exported': 0, 'export_errors': 0}
+
+    def finish(self, trace, root):
+        trace.finished = True
+        self.stats['traces'] += 1
+        slow = root.duration >= TRACE_SLOW_SECONDS
+        if not (trace.sampled or slow):
+            return
+        self.stats['kept'] += 1
+        self.stats['slow'] += slow
+        base = root.offset
+        self._pending.append({
+            'trace_id': trace.trace_id,
+            'name': trace.name,
+            'start': trace.started,
+            'duration_ms': round(root.duration * 1000, 2),
+            'slow': slow,
+            'sampled': trace.sampled,
+            'dropped_spans': trace.dropped_spans,
+            'spans': [
+                {
+                    'span_id': s.span_id,
+                    'parent_id': s.parent_id,
+                    'name': s.name,
+                    'offset_ms': round((s.offset - base) * 1000, 2),
+                    'duration_ms': round(s.duration * 1000, 2),
+                    'attributes': s.attributes,
+                    **({'error': s.error} if s.error else {}),
+                }
+                for s in sorted(trace.spans, key=lambda s: s.offset)
+            ],
+        })
+
+    def _write(self, batch):
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            for record in batch:
+                f.write(json.dumps(record, default=str) + "\n")
+        slow = [record for record in batch if record['slow']]
+        if slow:
+            with open(TRACE_SLOW_FILE, "a", encoding="utf-8") as f:
+                for record in slow:
+                    f.write(json.dumps(record, default=str) + "\n")
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch = list(self._pending)
+        self._pending.clear()
+        try:
+            await asyncio.to_thread(self._write, batch)
+            if TRACE_COLLECTOR_URL:
+                import httpx
+                async with httpx.AsyncClient(timeout=5) as client:
+                    response = await client.post(TRACE_COLLECTOR_URL, content=json.dumps(batch, default=str),
+                                                 headers={"Content-Type": "application/json"})
+                    response.raise_for_status()
+            self.stats['exported'] += len(batch)
+        except Exception as e:
+            self.stats['export_errors'] += 1
+            log.warning("Trace export failed: %s", e)
+
+    async def run(self, interval=TRACE_FLUSH_INTERVAL):
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.flush()
+        finally:
+            self._write(list(self._pending))
+
+    def snapshot(self):
+        return {**self.stats, 'pending': len(self._pending)}
+
+
+exporter = TraceExporter()
+
+
+def _describe(update):
+    attributes = {'update_id': getattr(update, 'update_id', None)}
+    chat = getattr(update, 'effective_chat', None)
+    if chat is not None:
+        attributes['chat_id'] = chat.id
+    if getattr(update, 'callback_query', None) is not None:
+        attributes['kind'] = "callback_query"
+        attributes['data'] = update.callback_query.data
+    elif getattr(update, 'message', None) is not None:
+        message = update.message
+        attributes['kind'] = "photo" if message.photo else "command" if (message.text or "").startswith("/") else "message"
+    return attributes
+
+
+class TracingUpdateProcessor(BaseUpdateProcessor):
+    # Runs updates concurrently like concurrent_updates(True), each inside a root span
+    async def do_process_update(self, update, coroutine):
+        with start_trace("update", **_describe(update)):
+            await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass